@@ -2,23 +2,38 @@
 ### Libraries / Functions                                                    ###
 ###--------------------------------------------------------------------------###
 
+# Heavy libraries (pydeck, plotly, wordcloud) are imported by the sections on first use
 from src.functions import fetch_data
-from src.functions import fetch_pag_data
+from src.functions import fetch_membership_data
 from src.functions import fetch_orga_data
 from src.functions import fetch_agenda_data
+from src.functions import system_url
+from src.functions import DISTRICTS
+from src.functions import build_members
+from src.functions import build_organization_index
+from src.functions import fetch_or_partial
+from src.functions import fetch_or_none
+from src.intervals import build_membership_intervals
+from src.ingest import load_district_snapshot
+from src.ingest import snapshot_version
+from src.warmup import ENABLED as WARMUP_ENABLED
+from src.warmup import get_warmup_scheduler
+from src.sections.district_map import render_map
+from src.sections.organizations import render_organizations
+from src.sections.membership_chart import render_membership_chart
+from src.sections.gender_timeline import render_gender_timeline
+from src.sections.roles import render_roles
+from src.sections.agenda import render_agenda
+from src.sections.comparison import render_comparison
+from src.sections.debug import render_debug_panel
+from src.metrics import DEBUG_PANEL
+from src.metrics import section
+from src.metrics import start_metrics_server
+from src.metrics import start_rerun
 
 import streamlit as st
-from pandas import json_normalize
 import pandas as pd
-import geopandas as gpd
-import numpy as np
-import plotly.express as px
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud
-from PIL import Image
-import requests
-import pydeck as pdk
-from shapely.geometry import mapping
+import time
 
 
 ###--------------------------------------------------------------------------###
@@ -27,6 +42,11 @@ from shapely.geometry import mapping
 
 st.set_page_config(layout= "wide")
 
+# Start of this rerun, for the debug waterfall
+rerun_started = time.time()
+rerun = start_rerun()
+start_metrics_server()
+
 col1, col2 = st.columns(2)
 
 # Text
@@ -37,163 +57,97 @@ col1.markdown("Die ALLRIS-Schnittstelle (Allgemeines Ratsinformationssystem) wir
 col2.image("https://upload.wikimedia.org/wikipedia/commons/b/b1/Berlin_Bezirk_Mitte_949-831-%28118%29.jpg", caption = "Skyline von Berlin-Mitte, Lotse, CC BY-SA 3.0, via Wikimedia Commons")
 
 # Filter data based on selected district
-district = ["Mitte", "Charlottenburg-Wilmersdorf", "Friedrichshain-Kreuzberg","Lichtenberg", "Marzahn-Hellersdorf", "Neukoelln", "Pankow", "Reinickendorf", "Steglitz-Zehlendorf", "Tempelhof-Schoeneberg", "Treptow-Koepenick"]
+district = DISTRICTS
 
 selected_district = col1.selectbox(
     "Wähle ein Bezirk:", district                 
 )
 
+# Warm the caches of all districts in the background, selected district first
+if WARMUP_ENABLED:
+    get_warmup_scheduler().prioritize(selected_district)
+
 ###--------------------------------------------------------------------------###
 ### Map based on selection                                                   ###
 ###--------------------------------------------------------------------------###
 
-# Load district geometry dataset
-# pre-processed geojson-file based on open data from geoportal Berlin (https://gdi.berlin.de/viewer/main/) 
-# 'ALKIS Berlin Bezirke', data accessible via WFS-Service
-bezirke = pd.read_csv("./csv/berlin_bezirke.csv")
-
-# Geometry format gpd.GeoSeries
-# print(bezirke["geometry"].dtype) -> geometry
-bezirke["geometry"] = gpd.GeoSeries.from_wkt(bezirke["geometry"])
-
-# Convert to GeoDataFrame
-bezirke = gpd.GeoDataFrame(bezirke, geometry="geometry")
-
-# Filter the data based on the selected district
-district_geom = bezirke[bezirke["namgem"] == selected_district]
-
-# Pydeck requires a GeoJSON dictionary, not a Shapely Polygon
-# Convert geometry
-district_geojson = mapping(district_geom["geometry"].values[0])
-
-# Set map view state ->Berlin
-view_state = pdk.ViewState(latitude=52.52, longitude=13.4050, zoom=10)
-
-# Pydeck map
-deck = pdk.Deck(
-    initial_view_state=view_state,
-    layers=[
-        pdk.Layer(
-            "GeoJsonLayer",
-            data=district_geojson,
-            get_fill_color="[78, 141, 111, 255]", # RGBA
-            get_line_color="[0, 0, 0]",  # Black 
-            line_width=2,
-            pickable=True,
-            opacity=0.5
-            ),
-    ],
-    map_style="https://basemaps.cartocdn.com/gl/positron-gl-style/style.json" # carto positron
-)
-
-st.pydeck_chart(deck)
+with section("map"):
+    render_map(selected_district)
 
 ###--------------------------------------------------------------------------###
 ### Load distric data via API                                                ###
 ###--------------------------------------------------------------------------###
 
 
+# Snapshot written by the headless ingester (python -m src.ingest), if available
+with section("snapshot"):
+    snapshot = load_district_snapshot(selected_district, snapshot_version(selected_district))
+
 # System data
 selected_district = selected_district.lower()
 
-if selected_district:
-    systemUrl = f"https://www.sitzungsdienst-{selected_district}.de/oi/oparl/1.0/system.asp"
+if snapshot:
+    persons_with_membership = snapshot["memberships"]
+    orgaData = snapshot["organizations"]
+    meetingUrl = snapshot["meta"]["meeting"]
 
-    # Fetch data
-    systemData = fetch_data(systemUrl)
+elif selected_district:
+    systemUrl = system_url(selected_district)
 
-    
-# Bodies data
-bodyUrl = systemData["body"]
-bodiesData = fetch_data(bodyUrl)
+    # Fetch data
+    with section("system/body"):
+        systemData = fetch_or_none(fetch_data, systemUrl)
 
-# Person data
-personUrl = bodiesData["data"][0]["person"]
-personData = fetch_pag_data(personUrl)
+        # Bodies data
+        bodiesData = fetch_or_none(fetch_data, systemData["body"]) if systemData else None
 
-# Filter persons with membership data
-persons_with_membership = [person for person in personData if "membership" in person]
+    if not bodiesData or not bodiesData.get("data"):
+        st.error(f"Die Schnittstelle von {selected_district} ist zurzeit nicht erreichbar. Bitte später erneut versuchen.")
+        st.stop()
 
-# normalize the data
-persons_with_membership = json_normalize(
-    persons_with_membership,
-    "membership",  
-    ["name", "familyName", "givenName", "formOfAddress"],  # Keys to extract
-    errors="ignore")
+    # Person data
+    personUrl = bodiesData["data"][0]["person"]
+    # Memberships of all persons, one row per membership
+    with section("memberships"):
+        persons_with_membership = fetch_or_partial(fetch_membership_data, personUrl)
 
+    # Orga data
+    with section("organizations"):
+        orgaData = fetch_or_partial(fetch_orga_data, persons_with_membership, bodiesData["data"][0].get("organization"))
 
-###--------------------------------------------------------------------------###
-### Orga data                                                                ###
-###--------------------------------------------------------------------------###
-
-orgaData = fetch_orga_data(persons_with_membership)
-
-st.subheader("Bezirksverordnetenversammlung, Ausschüsse und Fraktionen")
-st.caption("Übersicht aller Organisationen mit Angabe zu Kurzform, Kategorie und Klassifikation. Klicke auf 'Mitglieder anzeigen', um alle aktuellen Mitglieder einzusehen.")
-
-# Current members
-members = pd.merge(persons_with_membership, orgaData, on= "organization", how="left")
-currentMembers = members[members["endDate"].isna()]
-
-# Current orga data
-orgaData["orga_endDate"] = pd.to_datetime(orgaData["orga_endDate"], errors="coerce")
-orgaData = orgaData[(orgaData["orga_endDate"].isna())]
-
-# Create grid layout for evenly distributed orga names
-for i in range(0, len(orgaData), 3):
-    cols = st.columns(3)
-    for col, (_, row) in zip(cols, orgaData.iloc[i:i + 3].iterrows()):
-        with col:
-            st.markdown(f"**{row['orgaName']}**")
-            st.caption(f"{row['shortName']} | {row['orgaType']} | {row['classification']}")
-        
-            # Toggle to show names and roles
-            with st.expander("Mitglieder anzeigen"):
-                # Filter by organization
-                members = currentMembers[currentMembers["orgaName"] == row["orgaName"]]
-                
-                # Display names and roles
-                if not members.empty:
-                    member_list = ", ".join(f"{name} ({role})" for name, role in zip(members["name"], members["role"]))
-                    st.markdown(member_list)
-                else:
-                    st.caption("Keine Mitglieder verfügbar.")
+    meetingUrl = bodiesData["data"][0]["meeting"]
 
 
 ###--------------------------------------------------------------------------###
-### Current number of persons by Orga                                        ###
+### Orga data                                                                ###
 ###--------------------------------------------------------------------------###
 
-st.subheader("Aktuelle Mitgliederanzahl je Organisation")
-
-# Current members
-members = pd.merge(persons_with_membership, orgaData, on= "organization", how="left")
-currentMembers = members[members["endDate"].isna()]
-
-noMembers_perOrga = currentMembers["orgaName"].value_counts().reset_index()
-noMembers_perOrga.columns = ["organization", "noMembers"]
+# Memberships joined with their organizations, built once per dataset
+with section("members"):
+    members = snapshot["members"] if snapshot else build_members(persons_with_membership, orgaData)
 
-# Sort organizations by number of members in descending order
-noMembers_perOrga = noMembers_perOrga.sort_values("noMembers")
+# Current members: memberships active today, from the membership interval index
+with section("current members"):
+    memberIntervals = build_membership_intervals(members)
+    currentMembers = members.iloc[memberIntervals.active_at(pd.Timestamp("today").normalize())]
 
-fig = px.bar(noMembers_perOrga, x = "noMembers", y = "organization",
-             text=noMembers_perOrga["noMembers"],
-             labels = {"noMembers": "Mitgliederanzahl", "organization": "Ausschuss/Fraktion"})
+# Current orga data (snapshot tables are shared by all sessions, so they are filtered, not modified)
+orgaData = orgaData[pd.to_datetime(orgaData["orga_endDate"], errors="coerce").isna()]
 
+# Current members grouped by organization, shared by the grid and the chart
+with section("organization index"):
+    orgaIndex = build_organization_index(orgaData, currentMembers)
 
-fig.update_layout(height=600)
+with section("organizations grid"):
+    render_organizations(orgaIndex)
 
-# Different bar color for fraktionen
-fraktionen = {"Grünen", "Grüne", "SPD", "Linke","CDU", "FDP", "AFD", "BSW", "Fraktion "}
 
-colors = noMembers_perOrga["organization"].str.lower().apply(
-    lambda x: "#4E8D6F" if any(f.lower() in x for f in fraktionen) else "#8bbf9f")
-
-fig.update_traces(marker_color= colors, textfont_size=16) # Edit marker colors/ font size
-fig.update_layout(yaxis={"categoryorder":"total ascending"})  # Sort
-
-st.plotly_chart(fig, use_container_width = True)
+###--------------------------------------------------------------------------###
+### Current number of persons by Orga                                        ###
+###--------------------------------------------------------------------------###
 
+with section("membership chart"):
+    render_membership_chart(orgaIndex)
 
 
 ###--------------------------------------------------------------------------###
@@ -218,292 +172,50 @@ st.plotly_chart(fig, use_container_width = True)
 # st.write(" ")
 
 
-
 ###--------------------------------------------------------------------------###
 ### gender proportion of active members over time                            ###
 ###--------------------------------------------------------------------------###
 
-# Filter all past and current members by BVV
-BVV_all_years = members[(members["classification"] == "BVV") | (members["classification"] == "Bezirksparlament") | (members["classification"] == "Bezirk") | (members["classification"] == "Bezirksverordnetenversammlung") | (members["classification"] == "Bezirksverordnete") | (members["classification"] == "Parlament") | (members["classification"] == "Stadtbezirk")]
-
-# Datetime
-BVV_all_years["startDate"] = pd.to_datetime(BVV_all_years["startDate"], errors="coerce")
-BVV_all_years["endDate"] = pd.to_datetime(BVV_all_years["endDate"], errors="coerce")
-
-# Year range
-min_year = BVV_all_years["startDate"].dt.year.min()
-max_year = pd.to_datetime("today").year
-
-min_year = int(min_year)
-max_year = int(max_year)
-
-st.subheader(f"Entwicklung der Geschlechterverteilung in der BVV {selected_district.title()} von {min_year} bis {max_year}")
-
-# Check if "formOfAddress" column exists
-if "formOfAddress" not in BVV_all_years.columns or BVV_all_years["formOfAddress"].isnull().all():
-    st.error("Error: 'formOfAddress' column is missing or contains only invalid values.")
-else:
-    
-    # List
-    all_years_data = []
-
-    # Loop through the range of years
-    for year in range(min_year, max_year + 1):
-        # Filter rows where the person was active during the specific year
-        df_year = BVV_all_years[
-            (BVV_all_years["startDate"].dt.year <= year) & 
-            ((BVV_all_years["endDate"].dt.year >= year) | BVV_all_years["endDate"].isna())
-        ]
-
-        # Strip whitespace
-        df_year["formOfAddress"] = df_year["formOfAddress"].str.strip()
-
-        # Map gender
-        gender_mapping = {"Frau": "w", "Herr": "m"}
-        df_year["gender"] = df_year["formOfAddress"].map(gender_mapping)
-
-        # Absolute counts
-        # .shape[0] counts number of matching rows
-        male_count = df_year[df_year["gender"] == "m"].shape[0]
-        female_count = df_year[df_year["gender"] == "w"].shape[0]
-
-        # Members by gender, percent
-        noMembers_byGender = df_year["gender"].value_counts(normalize=True).round(3) * 100 
-
-        # Percent by gender
-        perc_fem = noMembers_byGender.get("w", 0)
-        perc_mal = noMembers_byGender.get("m", 0)
-
-        # Append year and calculated percentages to list
-        all_years_data.append({
-            "Jahr": year,
-            "Anteil Frauen %": perc_fem,
-            "Anteil Männer %": perc_mal,
-            "Anzahl Frauen": female_count,
-            "Anzahl Männer": male_count
-        })
-
-    # DataFrame
-    all_years_gender = pd.DataFrame(all_years_data)
-
-    color_map = {
-        "Anteil Frauen %": "#c1a5fe",  
-        "Anteil Männer %": "#4E8D6F"
-        }
-
-    fig = px.line(
-        all_years_gender,
-        x= "Jahr",
-        y=["Anteil Frauen %", "Anteil Männer %"],
-        labels={"value": "Prozent", "Jahr": "Jahr"},
-        markers=True,
-        color_discrete_map=color_map
-    )
-
-    fig.update_traces(
-        hovertemplate=(
-            "Jahr: %{x}<br>"
-            "Anteil Frauen %: %{customdata[0]:.2f}<br>"  
-            "Anteil Männer %: %{customdata[1]:.2f}<br>"  
-            "Anzahl Frauen: %{customdata[2]}<br>" 
-            "Anzahl Männer: %{customdata[3]}" 
-        ),
-        customdata=all_years_gender[["Anteil Frauen %", "Anteil Männer %", "Anzahl Frauen", "Anzahl Männer"]].values,  # custom data as array
-    )
-    
-    fig.update_layout(
-        yaxis=dict(ticksuffix="%"),
-        legend_title_text="Legende"
-    )
-
-    st.plotly_chart(fig, use_container_width=True)
-
-# Show dataset if checkbox
-if st.checkbox("Datensatz anzeigen"):
-    st.write(BVV_all_years[["role", "votingRight", "startDate", "endDate", "name", "formOfAddress", "orgaName", "shortName", "orgaType", "classification", "orga_startDate", "orga_endDate"]].reset_index(drop=True))
-
+with section("gender timeline"):
+    render_gender_timeline(members, selected_district)
 
 
 ###--------------------------------------------------------------------------###
 ### average no. of roles per person f/m                                      ###
 ###--------------------------------------------------------------------------###
 
-
-# Check if "formOfAddress" column exists
-if "formOfAddress" not in currentMembers.columns or currentMembers["formOfAddress"].isnull().all():
-    st.error("Error: 'formOfAddress' column is missing or contains only invalid values.")
-else:
-    st.subheader("Durchschnittliche Anzahl an Rollen pro Person nach Geschlecht")
-    st.caption("Einige Mitglieder der BVV übernehmen weitere Funktionen in Ausschüssen und Fraktionen. In der folgenden Visualisierung wird die durchschnittliche Anzahl an Rollen nach Geschelcht dargestellt.")
-
-    gender_role_counts = currentMembers.groupby(["formOfAddress", "name"]).size().reset_index(name="roles")
-    # Map gender
-    gender_role_counts["formOfAddress"] = gender_role_counts["formOfAddress"].map({"Herr": "M", "Frau": "W"})
-    # Average number in column "roles"
-    gender_role_avg = gender_role_counts.groupby("formOfAddress")["roles"].mean().reset_index()
-    gender_role_avg["roles"] = gender_role_avg["roles"].round(2)
-    # Average number by gender
-    male_avg = gender_role_avg[gender_role_avg["formOfAddress"] == "M"]["roles"].item()
-    female_avg = gender_role_avg[gender_role_avg["formOfAddress"] == "W"]["roles"].item()
-
-    # Show metric in two columns
-    col3, col4 = st.columns(2)
-
-    with col3:
-        st.metric("⌀ Anzahl an Rollen", f"{male_avg:.2f}")
-        st.metric("⌀ Anzahl an Rollen", f"{female_avg:.2f}")
-        
-    with col4:
-        # Add visual representation
-        max_value = max(male_avg, female_avg)
-        male_width = (male_avg / max_value) * 100
-        female_width = (female_avg / max_value) * 100
-
-        # st.progress() does not support custom hex color values
-        # workaround with html
-        st.markdown(f"""
-        <div style="display: flex; align-items: center; margin-bottom: 10px;">
-            <div style="width: 50px; text-align: right; margin-right: 10px;font-size: 14px;">Männer</div>
-            <div style="background-color: #4E8D6F; width: {male_width}%; height: 20px;"></div>
-        </div>
-        <br>
-        <div style="display: flex; align-items: center;">
-            <div style="width: 50px; text-align: right; margin-right: 10px;font-size: 14px;">Frauen</div>
-            <div style="background-color: #c1a5fe; width: {female_width}%; height: 20px;"></div>
-        </div>
-        """, unsafe_allow_html=True)
+with section("roles"):
+    render_roles(currentMembers)
 
 st.write(" ")
 st.write(" ")
 
 
-
 ###--------------------------------------------------------------------------###
-### Load meetings data and agenda items                                      ###
+### Meetings, agenda items, word cloud and search                            ###
 ###--------------------------------------------------------------------------###
 
-st.subheader("Sitzungen und Tagesordnungspunkte")
-
-# most recent meeting data
-meetingUrl = bodiesData["data"][0]["meeting"]
-meetingData = fetch_data(meetingUrl)
-
-#agendaItems
-agendaData = fetch_agenda_data(meetingData)
-
-# Initialize agenda_item_names
-agenda_item_names = []
-
-# Check if agenda data is empty
-if not agendaData or all(
-    len(meeting.get("agendaItems", [])) == 0 for meeting in agendaData
-):
-    # Show an error message if no agenda items are found
-    st.error(f"Error: No agenda items found for {selected_district}.")
-else:
-    # Extract agenda item names
-    agenda_item_names = [
-        agendaItem["name"]
-        for meeting in agendaData
-        for agendaItem in meeting.get("agendaItems", [])
-        if "name" in agendaItem
-    ]
-
-agendaItems = pd.DataFrame(agenda_item_names, columns=["Agenda Items"])
+# Agenda items of all meetings
+with section("agenda data"):
+    agendaItems = snapshot["agenda"] if snapshot else fetch_or_partial(fetch_agenda_data, meetingUrl)
 
+with section("agenda"):
+    render_agenda(agendaItems, selected_district)
 
 
 ###--------------------------------------------------------------------------###
-### word cloud from the agenda items                                         ###
+### Comparison of all districts (materialized aggregates, no API requests)   ###
 ###--------------------------------------------------------------------------###
 
-col3, col4 = st.columns(2)
-
-
-if len(agenda_item_names) > 0:
-    with col3:
-        st.caption("Durchsuche die aktuellsten Sitzungsdaten und filtere nach einem Tagesordnungspunkt, der dich interessiert:")
-        stopwords = set([
-            "der", "die", "das", "und", "zur", "von", "den", "im", "des", "aus", "einer",
-            "zu", "auf", "für", "mit", "nicht", "bei", "über", "als", "es", "dem","eine",
-            "werden", "eine", "oder", "an", "ein", "haben", "nach", "mehr", "dass","ist",
-            "am", "in", "auch", "zum", "liegen", "keine", "wie", "ohne", "vor", "gegen",
-            "vom", "von", "beim", "kein"
-        ])
-
-        # Combine all agenda items in one text
-        text = " ".join(agenda_item_names)
-
-        # Create word cloud, exclude stopwords
-        wordcloud = WordCloud(
-            width=800,  
-            height=400,  
-            background_color="white",  
-            colormap="Greys",  
-            max_words=100,  
-            stopwords=stopwords, 
-            contour_color="black",  
-            contour_width=1
-        ).generate(text)
-
-        # Plot word cloud
-        fig, ax = plt.subplots(figsize=(8, 4))
-        ax.imshow(wordcloud, interpolation="bilinear")
-        ax.axis("off")  
-
-        
-        st.pyplot(fig)
-
+st.write(" ")
 
+with section("comparison"):
+    render_comparison(selected_district)
 
 
 ###--------------------------------------------------------------------------###
-### Search agenda items in meetings                                          ###
+### Debug panel (BVV_DEBUG=1 or ?debug=1)                                    ###
 ###--------------------------------------------------------------------------###
 
-if len(agenda_item_names) > 0:
-  
-    # User input for the search word
-    word_to_search = col3.text_input("Bitte ein Suchwort eingeben (z.B. Verkehr, Bildung, Wohnen, Haushalt etc.):", "")
-
-    # Check if a search word is provided
-    if word_to_search:
-        matching_items = []
-
-        # Iterate through meetings and agenda items to find matches
-        for meeting in agendaData:
-
-            # Iterate over the agenda items for each meeting
-            for agenda_item in meeting.get("agendaItems", []):
-                # Check if the search word is in the agenda item name
-                if word_to_search.lower() in agenda_item["name"].lower():
-                    meeting_url = meeting["id"]
-
-                    try:
-                        response = requests.get(meeting_url)
-                        response.raise_for_status() 
-                        meeting_data = response.json()
-
-                        # Extract location description 
-                        location = meeting_data.get("location", {})
-                        location_description = location.get("description") or "unbekannt"
-
-                    except Exception as e:
-                        print(f"Failed to fetch location for meeting {meeting_url}: {e}")
-
-                    matching_items.append({
-                        "Name der Sitzung": meeting["name"],
-                        "Startzeitpunkt": meeting["start"],
-                        "Endzeitpunkt": meeting["end"],
-                        "Ort": location_description,
-                        "Tagesordnungspunkt": agenda_item["name"],
-                        "Öffentlich?": "Ja" if agenda_item["public"] else "Nein"
-                    })
-
-        # Display the matching results
-        if matching_items:
-            st.write(f"{len(matching_items)} Treffer für '{word_to_search}' gefunden:")
-            # Show results in data frame
-            st.dataframe(matching_items, use_container_width=True)  
-        else:
-            st.write(f"Keine Treffer für '{word_to_search}' gefunden.", use_container_width=True)
\ No newline at end of file
+if DEBUG_PANEL or st.query_params.get("debug") == "1":
+    render_debug_panel(rerun, rerun_started)
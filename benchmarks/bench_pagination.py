@@ -0,0 +1,35 @@
+"""
+Benchmark for fetch_pag_data against the local fake OParl server.
+
+Run from the repository root:
+    python -m benchmarks.bench_pagination
+"""
+
+import time
+
+from benchmarks.fake_oparl import FakeOParlServer
+from src import cache, scheduler
+from src.functions import fetch_pag_data
+
+
+def run(pages=20, page_size=20, latency=0.05, workers=(1, 2, 4, 8)):
+    # Measure the network path, not the disk cache
+    cache.CACHE_DIR = ""
+    scheduler.RATE_PER_HOST = scheduler.BURST = 1000
+
+    for with_page_count in (True, False):
+        with FakeOParlServer(persons=pages * page_size, page_size=page_size, latency=latency,
+                            with_page_count=with_page_count) as server:
+            for max_workers in workers:
+                fetch_pag_data.clear()
+                start = time.perf_counter()
+                data = fetch_pag_data(server.person_url, max_workers=max_workers)
+                elapsed = time.perf_counter() - start
+
+                assert [p["id"] for p in data] == [server.dataset.url(f"person/{i}") for i in range(pages * page_size)]
+                mode = "page count" if with_page_count else "next links"
+                print(f"{mode:<10} | workers={max_workers:<2} | pages={pages} | {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    run()
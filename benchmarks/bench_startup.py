@@ -0,0 +1,59 @@
+"""
+Cold-start benchmark: import time of the app modules and of the heavy libraries
+the sections load on first use, each measured in a fresh interpreter.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup [--repeat 3]
+"""
+
+import argparse
+import subprocess
+import sys
+
+# Modules imported by BVV_app.py before anything is drawn
+APP_MODULES = [
+    "streamlit",
+    "pandas",
+    "src.functions",
+    "src.ingest",
+    "src.warmup",
+    "src.sections.district_map",
+    "src.sections.organizations",
+    "src.sections.membership_chart",
+    "src.sections.gender_timeline",
+    "src.sections.roles",
+    "src.sections.agenda",
+    "src.sections.comparison",
+    "src.sections.debug",
+]
+
+# Libraries imported by the sections on first use
+LAZY_MODULES = ["pydeck", "plotly.express", "wordcloud", "shapely"]
+
+
+def import_time(modules):
+    """
+    Returns the seconds a fresh interpreter needs to import the modules.
+    """
+    code = (
+        "import time; start = time.perf_counter()\n"
+        + "".join(f"import {module}\n" for module in modules)
+        + "print(time.perf_counter() - start)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def run(repeat=3):
+    app = min(import_time(APP_MODULES) for _ in range(repeat))
+    print(f"{'app start (eager imports)':<28} | {app:.3f}s")
+    for module in LAZY_MODULES:
+        lazy = min(import_time(["streamlit", "pandas", module]) for _ in range(repeat)) \
+            - min(import_time(["streamlit", "pandas"]) for _ in range(repeat))
+        print(f"{module:<28} | +{max(lazy, 0):.3f}s on first use")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    run(parser.parse_args().repeat)
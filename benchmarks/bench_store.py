@@ -0,0 +1,120 @@
+"""
+Memory benchmark of the dataset store: memory per app process (proportional set size) when a district
+dataset is loaded from Parquet through st.cache_data (one unpickled copy per session and rerun)
+compared with the memory-mapped Arrow snapshot shared by all sessions (src/store.py).
+
+Run from the repository root (Linux, reads /proc/self/smaps_rollup):
+    python -m benchmarks.bench_store [--rows 1000000] [--sessions 1 10 50] [--processes 1 4]
+"""
+
+import argparse
+import multiprocessing
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from src.store import open_version, publish
+
+
+def synthetic_members(rows, seed=0):
+    """
+    Returns a data frame with the columns and dtypes of members_table and the given number of rows.
+    """
+    rng = np.random.default_rng(seed)
+    names = [f"Person {i}" for i in range(max(rows // 4, 1))]
+    orgas = [f"Ausschuss {i}" for i in range(200)]
+    start = pd.Timestamp("2006-01-01") + pd.to_timedelta(rng.integers(0, 7000, rows), "D")
+    end = (start + pd.to_timedelta(rng.integers(30, 3000, rows), "D")).where(rng.random(rows) < 0.7)
+    return pd.DataFrame({
+        "person_key": rng.integers(0, len(names), rows).astype("int32"),
+        "orga_key": rng.integers(0, len(orgas), rows).astype("int32"),
+        "organization": pd.Categorical(rng.choice([f"https://example.org/oparl/organization/{i}" for i in range(200)], rows)),
+        "role": pd.Categorical(rng.choice(["Mitglied", "Vorsitz", "Stellv. Vorsitz"], rows)),
+        "startDate": start,
+        "endDate": end,
+        "name": pd.Categorical(rng.choice(names, rows)),
+        "formOfAddress": pd.Categorical(rng.choice(["Frau", "Herr"], rows)),
+        "orgaName": pd.Categorical(rng.choice(orgas, rows)),
+        "note": pd.Series(rng.choice([f"Tagesordnungspunkt {i}" for i in range(5000)], rows)).astype("str"),
+    })
+
+
+def proportional_memory():
+    """
+    Returns the proportional set size (bytes) of this process: private pages plus
+    its share of the pages mapped by several processes (e.g. the same snapshot file).
+    """
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def worker(mode, path, version, sessions, barrier, results):
+    # Load the libraries first, so only the data is measured
+    import pyarrow.ipc  # noqa: F401
+    import pyarrow.parquet  # noqa: F401
+    held = []
+    barrier.wait()
+    before = proportional_memory()
+
+    if mode == "parquet + cache_data":
+        # st.cache_data keeps the pickled result and returns an unpickled copy to every caller
+        cached = pickle.dumps(pd.read_parquet(path))
+        for _ in range(sessions):
+            held.append(pickle.loads(cached))
+    else:
+        # st.cache_resource returns the same memory-mapped frames to every session
+        dataset = open_version(path, version, ["members"])
+        for _ in range(sessions):
+            held.append(dataset["members"])
+
+    # Read all values, as the app's analytics do
+    for column in held[0].columns:
+        pd.util.hash_pandas_object(held[0][column], index=False).sum()
+
+    barrier.wait()  # all processes have mapped the data
+    results.put(proportional_memory() - before)
+    barrier.wait()  # keep all processes alive until each has measured
+
+
+def run(rows, sessions_list, processes_list):
+    members = synthetic_members(rows)
+    directory = tempfile.mkdtemp()
+    parquet = os.path.join(directory, "members.parquet")
+    members.to_parquet(parquet, index=False)
+    store = os.path.join(directory, "store")
+    os.makedirs(store)
+    version = publish(store, {"members": members}, {})
+    print(f"{rows} rows, {members.memory_usage(deep=True).sum() / 1e6:.0f} MB in pandas")
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'mode':<24} | {'processes':>9} | {'sessions':>8} | {'MB per process':>14} | {'MB total':>8}")
+    for mode in ("parquet + cache_data", "arrow store (mmap)"):
+        path = parquet if mode == "parquet + cache_data" else store
+        for processes in processes_list:
+            for sessions in sessions_list:
+                barrier = context.Barrier(processes)
+                results = context.Queue()
+                workers = [context.Process(target=worker, args=(mode, path, version, sessions, barrier, results))
+                           for _ in range(processes)]
+                for process in workers:
+                    process.start()
+                measured = [results.get() for _ in workers]
+                for process in workers:
+                    process.join()
+                print(f"{mode:<24} | {processes:>9} | {sessions:>8} | {np.mean(measured) / 1e6:>14.1f} | "
+                      f"{np.sum(measured) / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+    run(args.rows, args.sessions, args.processes)
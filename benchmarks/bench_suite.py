@@ -0,0 +1,113 @@
+"""
+End-to-end benchmark of the data pipeline against the local fake OParl server:
+wall time, number of requests and peak memory (Python allocations) of each step
+at different district sizes.
+
+Run from the repository root:
+    python -m benchmarks.bench_suite [--scales 1 10 100] [--latency 0.02] [--error-rate 0.0] [--no-memory]
+"""
+
+import argparse
+import logging
+import time
+import tracemalloc
+
+from benchmarks.fake_oparl import FakeOParlServer
+from src import cache, scheduler
+from src.functions import (build_members, fetch_agenda_data, fetch_data, fetch_membership_data, fetch_orga_data,
+                           fetch_pag_data, gender_over_time)
+from src.resilience import IncompleteError
+from src.search import AgendaIndex, TermStats
+
+
+def measure(server, step, func, *args, memory=True, **kwargs):
+    """
+    Runs one step and prints wall time, requests to the server and peak memory.
+    The peak memory (Python allocations during the step) is measured in a second run,
+    since tracing allocations slows down the code considerably.
+    Returns the result of the step (the partial data if it was incomplete).
+    """
+    if hasattr(func, "clear"):
+        func.clear()  # Streamlit cache
+    requests_before = server.request_count
+    start = time.perf_counter()
+    partial = ""
+    try:
+        result = func(*args, **kwargs)
+    except IncompleteError as e:
+        result, partial = e.partial, " (partial)"
+    elapsed = time.perf_counter() - start
+    request_count = server.request_count - requests_before
+
+    peak = "-"
+    if memory:
+        if hasattr(func, "clear"):
+            func.clear()
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+        except IncompleteError:
+            pass
+        peak = f"{tracemalloc.get_traced_memory()[1] / 2 ** 20:.1f}"
+        tracemalloc.stop()
+
+    rows = len(result) if hasattr(result, "__len__") else ""
+    print(f"{step:<22} | {elapsed:8.3f}s | {request_count:>7} req | {peak:>8} MB | {rows:>8}{partial}")
+    return result
+
+
+def run_scale(scale, latency, error_rate, page_size, process, memory):
+    with FakeOParlServer.district(scale, latency=latency, error_rate=error_rate, page_size=page_size,
+                                  process=process) as server:
+        print(f"\nscale {scale}x: {server.dataset.sizes} | latency {latency}s | error rate {error_rate}")
+        print(f"{'step':<22} | {'wall':>9} | {'requests':>11} | {'peak':>11} | {'rows':>8}")
+
+        def step(name, func, *args):
+            return measure(server, name, func, *args, memory=memory)
+
+        system = step("fetch_data (system)", fetch_data, server.system_url)
+        body = step("fetch_data (body)", fetch_data, system["body"])["data"][0]
+        step("fetch_pag_data", fetch_pag_data, body["person"])
+        memberships = step("fetch_membership_data", fetch_membership_data, body["person"])
+        orgaData = step("fetch_orga_data", fetch_orga_data, memberships, body["organization"])
+        agendaItems = step("fetch_agenda_data", fetch_agenda_data, body["meeting"])
+
+        # Analytics (no requests)
+        members = step("build_members", build_members, memberships, orgaData)
+        step("gender_over_time (Y)", gender_over_time, members, "Y")
+        step("gender_over_time (wp)", gender_over_time, members, "election")
+        names = tuple(agendaItems["name"].dropna())
+        index = step("AgendaIndex", AgendaIndex, names)
+        step("AgendaIndex.search", index.search, "radweg")
+        step("TermStats.update", TermStats().update, agendaItems)
+
+        if server.error_count:
+            print(f"injected errors: {server.error_count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", nargs="+", type=int, default=[1, 10, 100], help="District sizes (multiples of DISTRICT_SIZE)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Server latency per request in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 503")
+    parser.add_argument("--page-size", type=int, default=20, help="Objects per list page")
+    parser.add_argument("--rate", type=float, default=1000, help="Requests per second per host allowed by the scheduler")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the second, traced run of each step")
+    parser.add_argument("--in-process", action="store_true", help="Serve from a thread instead of a forked process")
+    args = parser.parse_args()
+
+    # Measure the network path, not the disk cache
+    cache.CACHE_DIR = ""
+    # The politeness limit of the real servers is not what is measured here, unless set with --rate
+    scheduler.RATE_PER_HOST = scheduler.BURST = args.rate
+    # Streamlit warns about the missing script run context outside of 'streamlit run'
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+    for scale in args.scales:
+        run_scale(scale, args.latency, args.error_rate, args.page_size, not args.in_process, not args.no_memory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+------------------------------------------------------------------------------
+Local fake OParl server for benchmarks
+------------------------------------------------------------------------------
+"""
+
+import json
+import multiprocessing
+import random
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+SCHEMA = "https://schema.oparl.org/1.0/"
+
+# Size of a district at scale 1 (roughly a Berlin BVV with its history since 2006)
+DISTRICT_SIZE = {"persons": 500, "organizations": 80, "meetings": 400, "agenda_items": 8}
+
+GIVEN_NAMES = ["Anna", "Jonas", "Fatma", "Lukas", "Marie", "Mehmet", "Sophie", "Paul", "Lea", "Tobias"]
+FAMILY_NAMES = ["Müller", "Schmidt", "Yılmaz", "Schneider", "Fischer", "Weber", "Nowak", "Becker", "Wagner", "Hoffmann"]
+FACTIONS = ["SPD", "CDU", "Grüne", "Linke", "FDP", "AfD"]
+TOPICS = ["Stadtentwicklung", "Schule und Sport", "Verkehr", "Haushalt", "Umwelt und Natur", "Soziales",
+          "Jugendhilfe", "Kultur", "Bürgerdienste", "Integration", "Gesundheit", "Wirtschaft"]
+AGENDA_TERMS = ["Bebauungsplan", "Radweg", "Spielplatz", "Schulsanierung", "Haushaltsplan", "Baumfällungen",
+                "Parkraumbewirtschaftung", "Straßenbeleuchtung", "Jugendfreizeiteinrichtung", "Wohnungsbau",
+                "Bürgeramt", "Grünanlage", "Kita-Plätze", "Sportplatz", "Mietspiegel", "Tempo 30"]
+AGENDA_FORMS = ["Antrag der Fraktion {faction}: {term} in der {street}", "Große Anfrage zu {term}",
+                "Beschlussempfehlung: {term}", "Mitteilung des Bezirksamtes zum Thema {term}",
+                "{term} {street}", "Einwohneranfrage: {term}"]
+STREETS = ["Hauptstraße", "Karl-Marx-Allee", "Schönhauser Allee", "Sonnenallee", "Müllerstraße", "Kantstraße"]
+ELECTIONS = [date(2006, 9, 17), date(2011, 9, 18), date(2016, 9, 18), date(2021, 9, 26), date(2023, 2, 12)]
+
+# Paths of lists and objects, e.g. /oparl/person?body=1&page=2 and /oparl/person/17
+LIST_PATH = re.compile(r"^/oparl/(person|organization|meeting)$")
+OBJECT_PATH = re.compile(r"^/oparl/(person|organization|meeting|location)/(\d+)$")
+
+
+class FakeDataset:
+    """
+    Deterministic OParl 1.0 objects of one body. Objects are generated on request
+    from their index, so the dataset size does not affect the server's memory.
+
+    Args:
+    - base_url: URL prefix of all object ids.
+    - persons, organizations, meetings: Number of objects of each type.
+    - agenda_items: Number of agenda items per meeting.
+    - linked_locations: Link meeting locations by URL instead of embedding them.
+    """
+
+    def __init__(self, base_url, persons, organizations, meetings, agenda_items, linked_locations=False):
+        self.base_url = base_url
+        self.sizes = {"person": persons, "organization": organizations, "meeting": meetings}
+        self.agenda_items = agenda_items
+        self.linked_locations = linked_locations
+        self.locations = max(1, organizations // 4)
+
+    def url(self, path):
+        return f"{self.base_url}/oparl/{path}"
+
+    def list_url(self, kind, page=1):
+        return self.url(f"{kind}?body=1&page={page}")
+
+    @staticmethod
+    def modified(i):
+        # Spread over one year, so 'modified_since' filters have something to do
+        return datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(hours=i % (365 * 24))
+
+    def system(self):
+        return {
+            "id": self.url("system"),
+            "type": SCHEMA + "System",
+            "oparlVersion": SCHEMA,
+            "name": "Fake OParl",
+            "body": self.url("body"),
+        }
+
+    def body(self):
+        return {
+            "id": self.url("body/1"),
+            "type": SCHEMA + "Body",
+            "name": "Bezirksverordnetenversammlung Fake",
+            "shortName": "BVV Fake",
+            "person": self.list_url("person"),
+            "organization": self.list_url("organization"),
+            "meeting": self.list_url("meeting"),
+        }
+
+    def person(self, i):
+        rng = random.Random(i)
+        given_name, family_name = rng.choice(GIVEN_NAMES), rng.choice(FAMILY_NAMES)
+        faction = i % len(FACTIONS)
+        elected = rng.randrange(len(ELECTIONS))
+
+        memberships = []
+        for k, organization in enumerate([0, 1 + faction] + rng.sample(range(1, self.sizes["organization"]),
+                                                                          min(rng.randint(0, 3), self.sizes["organization"] - 1))):
+            start = ELECTIONS[elected] + timedelta(days=rng.randint(0, 60))
+            end = ELECTIONS[elected + 1] if elected + 1 < len(ELECTIONS) and rng.random() < 0.7 else None
+            membership = {
+                "id": self.url(f"membership/{i}-{k}"),
+                "type": SCHEMA + "Membership",
+                "organization": self.url(f"organization/{organization % self.sizes['organization']}"),
+                "role": "Mitglied" if k else rng.choice(["Bezirksverordnete/r", "Vorsitzende/r", "Stellv. Vorsitzende/r"]),
+                "votingRight": True,
+                "startDate": start.isoformat(),
+                "web": f"{self.base_url}/membership/{i}-{k}.html",
+            }
+            if end:
+                membership["endDate"] = end.isoformat()
+            if k == 0:
+                membership["onBehalfOf"] = self.url(f"organization/{(1 + faction) % self.sizes['organization']}")
+            memberships.append(membership)
+
+        return {
+            "id": self.url(f"person/{i}"),
+            "type": SCHEMA + "Person",
+            "body": self.url("body/1"),
+            "name": f"{given_name} {family_name}",
+            "familyName": family_name,
+            "givenName": given_name,
+            "formOfAddress": "Frau" if rng.random() < 0.45 else "Herr",
+            "membership": memberships,
+            "web": f"{self.base_url}/person/{i}.html",
+            "created": "2020-01-01T00:00:00+01:00",
+            "modified": self.modified(i).isoformat(),
+        }
+
+    def organization(self, i):
+        rng = random.Random(-i - 1)
+        if i == 0:
+            name, short_name, classification = "Bezirksverordnetenversammlung", "BVV", "Bezirksverordnetenversammlung"
+        elif i <= len(FACTIONS):
+            name, short_name, classification = f"Fraktion {FACTIONS[i - 1]}", FACTIONS[i - 1], "Fraktion"
+        else:
+            topic = TOPICS[i % len(TOPICS)]
+            name, short_name, classification = f"Ausschuss für {topic} ({i})", f"A{i}", "Ausschuss"
+
+        organization = {
+            "id": self.url(f"organization/{i}"),
+            "type": SCHEMA + "Organization",
+            "body": self.url("body/1"),
+            "name": name,
+            "shortName": short_name,
+            "organizationType": "Gremium" if classification != "Fraktion" else "Fraktion",
+            "classification": classification,
+            "startDate": rng.choice(ELECTIONS).isoformat(),
+            "web": f"{self.base_url}/organization/{i}.html",
+            "created": "2020-01-01T00:00:00+01:00",
+            "modified": self.modified(i).isoformat(),
+        }
+        # Some committees of earlier periods are closed
+        if i > len(FACTIONS) and rng.random() < 0.5:
+            organization["endDate"] = ELECTIONS[-1].isoformat()
+        return organization
+
+    def location(self, i):
+        return {
+            "id": self.url(f"location/{i}"),
+            "type": SCHEMA + "Location",
+            "description": f"Rathaus, Raum {100 + i}",
+        }
+
+    def meeting(self, i):
+        rng = random.Random(10 ** 9 + i)
+        organization = self.organization(len(FACTIONS) + 1 + i % max(1, self.sizes["organization"] - len(FACTIONS) - 1)) \
+            if i % 3 else self.organization(0)
+        start = datetime(2006, 11, 1, 17, 0) + timedelta(days=i * 6570 // max(1, self.sizes["meeting"]))
+        location = i % self.locations
+        agenda_items = []
+        for k in range(self.agenda_items):
+            term = rng.choice(AGENDA_TERMS)
+            agenda_items.append({
+                "id": self.url(f"agendaitem/{i}-{k}"),
+                "type": SCHEMA + "AgendaItem",
+                "meeting": self.url(f"meeting/{i}"),
+                "number": f"{k + 1}",
+                "name": rng.choice(AGENDA_FORMS).format(faction=rng.choice(FACTIONS), term=term, street=rng.choice(STREETS)),
+                "public": rng.random() < 0.9,
+            })
+
+        return {
+            "id": self.url(f"meeting/{i}"),
+            "type": SCHEMA + "Meeting",
+            "name": f"{rng.randint(1, 60)}. Sitzung {organization['name']}",
+            "start": start.isoformat(),
+            "end": (start + timedelta(hours=3)).isoformat(),
+            "location": self.url(f"location/{location}") if self.linked_locations else self.location(location),
+            "organization": [organization["id"]],
+            "agendaItem": agenda_items,
+            "web": f"{self.base_url}/meeting/{i}.html",
+            "created": "2020-01-01T00:00:00+01:00",
+            "modified": self.modified(i).isoformat(),
+        }
+
+    def get(self, kind, i):
+        """
+        Returns the object of the given type and index, or None if it does not exist.
+        """
+        size = self.locations if kind == "location" else self.sizes[kind]
+        return getattr(self, kind)(i) if 0 <= i < size else None
+
+    def list_page(self, kind, page, page_size, with_page_count=True, modified_since=None):
+        """
+        Returns one page of an object list as OParl list response, or None if the page does not exist.
+        """
+        indexes = range(self.sizes[kind])
+        if modified_since:
+            since = datetime.fromisoformat(modified_since)
+            indexes = [i for i in indexes if self.modified(i) >= since]
+
+        pages = max(1, -(-len(indexes) // page_size))
+        if not 1 <= page <= pages:
+            return None
+
+        query = f"&modified_since={modified_since}" if modified_since else ""
+        links = {"first": self.list_url(kind) + query}
+        if page > 1:
+            links["prev"] = self.list_url(kind, page - 1) + query
+        if page < pages:
+            links["next"] = self.list_url(kind, page + 1) + query
+
+        body = {
+            "data": [getattr(self, kind)(i) for i in indexes[(page - 1) * page_size:page * page_size]],
+            "links": links,
+        }
+        if with_page_count:
+            links["last"] = self.list_url(kind, pages) + query
+            body["pagination"] = {
+                "totalElements": len(indexes),
+                "elementsPerPage": page_size,
+                "currentPage": page,
+                "totalPages": pages,
+            }
+        return body
+
+
+class FakeOParlServer:
+    """
+    Serves a fake OParl 1.0 system on localhost: system, body, the paginated person,
+    organization and meeting lists and the single objects (incl. locations).
+
+    Args:
+    - persons, organizations, meetings: Number of objects of each type.
+    - agenda_items: Number of agenda items per meeting.
+    - page_size: Number of objects per list page.
+    - latency: Delay (in seconds) before each response.
+    - with_page_count: Include 'pagination' and 'links.last' in the list responses.
+    - error_rate: Fraction of requests answered with error_status instead of the data.
+    - error_status: HTTP status of injected errors.
+    - retry_after: Value of the Retry-After header of injected errors (seconds), default none.
+    - linked_locations: Link meeting locations by URL instead of embedding them.
+    - process: Serve from a forked process, so generating the responses does not
+      compete with the measured code for the GIL (POSIX only).
+    - seed: Seed of the error injection.
+
+    The number of requests (request_count) and of injected errors (error_count) are
+    counted across threads and processes.
+    """
+
+    def __init__(self, persons=400, organizations=20, meetings=100, agenda_items=8, page_size=20, latency=0.05,
+                 with_page_count=True, error_rate=0.0, error_status=503, retry_after=None, linked_locations=False,
+                 process=False, seed=0):
+        self.page_size = page_size
+        self.latency = latency
+        self.with_page_count = with_page_count
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.process = process
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counts = multiprocessing.Array("l", 2)  # requests, errors
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.dataset = FakeDataset(self.base_url, persons, organizations, meetings, agenda_items, linked_locations)
+        self._worker = None
+
+    @classmethod
+    def district(cls, scale=1, **kwargs):
+        """
+        Returns a server with the dataset size of a district (DISTRICT_SIZE) times scale.
+        """
+        sizes = {key: value * scale for key, value in DISTRICT_SIZE.items() if key != "agenda_items"}
+        sizes["agenda_items"] = DISTRICT_SIZE["agenda_items"]
+        sizes.update(kwargs)
+        return cls(**sizes)
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def system_url(self):
+        return self.dataset.url("system")
+
+    @property
+    def person_url(self):
+        return self.dataset.list_url("person")
+
+    @property
+    def organization_url(self):
+        return self.dataset.list_url("organization")
+
+    @property
+    def meeting_url(self):
+        return self.dataset.list_url("meeting")
+
+    @property
+    def pages(self):
+        """
+        Number of pages of the person list.
+        """
+        return max(1, -(-self.dataset.sizes["person"] // self.page_size))
+
+    @property
+    def request_count(self):
+        return self._counts[0]
+
+    @property
+    def error_count(self):
+        return self._counts[1]
+
+    def __enter__(self):
+        if self.process:
+            self._worker = multiprocessing.get_context("fork").Process(target=self._httpd.serve_forever, daemon=True)
+        else:
+            self._worker = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._worker.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.process:
+            self._worker.terminate()
+            self._worker.join()
+        else:
+            self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def respond(self, path, query):
+        """
+        Returns the JSON response to a GET request, or None if the path does not exist.
+        """
+        if path == "/oparl/system":
+            return self.dataset.system()
+        if path == "/oparl/body":
+            return {"data": [self.dataset.body()], "links": {},
+                    "pagination": {"totalElements": 1, "elementsPerPage": 1, "currentPage": 1, "totalPages": 1}}
+        if path == "/oparl/body/1":
+            return self.dataset.body()
+
+        match = LIST_PATH.match(path)
+        if match:
+            page = int(query.get("page", ["1"])[0])
+            modified_since = query.get("modified_since", [None])[0]
+            return self.dataset.list_page(match.group(1), page, self.page_size, self.with_page_count, modified_since)
+
+        match = OBJECT_PATH.match(path)
+        if match:
+            return self.dataset.get(match.group(1), int(match.group(2)))
+        return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server._counts[0] += 1
+                    failing = server._random.random() < server.error_rate
+                    if failing:
+                        server._counts[1] += 1
+                time.sleep(server.latency)
+
+                if failing:
+                    self.send_response(server.error_status)
+                    if server.retry_after is not None:
+                        self.send_header("Retry-After", str(server.retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                parts = urlsplit(self.path)
+                try:
+                    body = server.respond(parts.path, parse_qs(parts.query))
+                except ValueError:
+                    self.send_error(400)
+                    return
+                if body is None:
+                    self.send_error(404)
+                    return
+
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,219 @@
+"""
+------------------------------------------------------------------------------
+Libraries
+------------------------------------------------------------------------------
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+import pandas as pd
+import streamlit as st
+
+from src.functions import BVV_CLASSIFICATIONS, gender_over_time, organization_index
+from src.intervals import MembershipIntervals
+
+
+"""
+------------------------------------------------------------------------------
+Settings
+------------------------------------------------------------------------------
+"""
+
+# SQLite file of the per-district aggregates (small, a few thousand rows for all districts)
+AGGREGATES_FILE = os.environ.get("BVV_AGGREGATES_FILE",
+                                 os.path.join(os.environ.get("BVV_SNAPSHOT_DIR", "snapshots"), "aggregates.sqlite"))
+
+# Party names of the factions, in the spelling used for the comparison
+PARTIES = {"grünen": "Grüne", "grüne": "Grüne", "spd": "SPD", "linke": "Linke", "cdu": "CDU", "fdp": "FDP",
+           "afd": "AfD", "bsw": "BSW"}
+
+
+"""
+------------------------------------------------------------------------------
+Aggregates of one district
+------------------------------------------------------------------------------
+"""
+
+def faction_party(name):
+    """
+    Returns the party of a faction name (e.g. 'Grüne' for 'Fraktion Bündnis 90/Die Grünen'),
+    so factions can be compared across districts, or the name itself if no party is found.
+    """
+    lowered = str(name).lower()
+    for key, party in PARTIES.items():
+        if key in lowered:
+            return party
+    return str(name)
+
+
+def district_aggregates(members: pd.DataFrame, orgaData: pd.DataFrame, agenda: pd.DataFrame, today=None):
+    """
+    Computes the aggregates shown in the district comparison and returns a data frame
+    with one row per value (columns metric, key, value):
+    - women/men: BVV members by gender per year (key: year)
+    - faction_members: current members per faction (key: party)
+    - committee_members: current members per other organization (key: organization name)
+    - roles_per_person: average number of current roles per person (key: 'w'/'m')
+    - meetings/agenda_items: number of meetings and agenda items per year (key: year)
+
+    Args:
+    - members: all memberships (see members_table)
+    - orgaData: organizations (see resolve_orga_data)
+    - agenda: agenda items (see agenda_frame)
+    - today: day of the current members, defaults to today
+    """
+    today = pd.Timestamp(today) if today is not None else pd.Timestamp("today").normalize()
+    frames = []
+
+    def add(metric, values):
+        values = pd.Series(values, dtype="float64")
+        frames.append(pd.DataFrame({"metric": metric, "key": values.index.astype(str), "value": values.to_numpy()}))
+
+    # Gender of the BVV members per year
+    bvv = members[members["orga_current"] & members["classification"].isin(BVV_CLASSIFICATIONS)]
+    genders = gender_over_time(bvv, "Y", until=today)
+    if not genders.empty:
+        add("women", genders.set_index("Zeitraum")["Anzahl Frauen"])
+        add("men", genders.set_index("Zeitraum")["Anzahl Männer"])
+
+    # Current members per faction and committee
+    currentMembers = members.iloc[MembershipIntervals(members).active_at(today)]
+    currentOrgas = orgaData[pd.to_datetime(orgaData["orga_endDate"], errors="coerce").isna()]
+    orgaIndex = organization_index(currentOrgas, currentMembers)
+    orgaIndex = orgaIndex[orgaIndex["noMembers"] > 0]
+    factions = orgaIndex[orgaIndex["isFaction"]]
+    committees = orgaIndex[~orgaIndex["isFaction"] & ~orgaIndex["classification"].isin(BVV_CLASSIFICATIONS)]
+    add("faction_members", factions.groupby(factions["orgaName"].map(faction_party).values)["noMembers"].sum())
+    add("committee_members", committees.groupby(committees["label"].astype(str).values)["noMembers"].sum())
+
+    # Average number of current roles per person by gender
+    genders = currentMembers["formOfAddress"].astype(object).map({"Frau": "w", "Herr": "m"})
+    roles = currentMembers.groupby([genders.values, currentMembers["name"].astype(object).values]).size()
+    add("roles_per_person", roles.groupby(level=0).mean().round(2))
+
+    # Meetings and agenda items per year
+    if not agenda.empty:
+        years = pd.to_datetime(agenda["start"], errors="coerce", utc=True).dt.year
+        valid = years.notna()
+        add("agenda_items", years[valid].astype(int).value_counts().sort_index())
+        meetings = agenda.loc[valid, ["meeting"]].assign(year=years[valid].astype(int)).drop_duplicates("meeting")
+        add("meetings", meetings["year"].value_counts().sort_index())
+
+    if not frames:
+        return pd.DataFrame(columns=["metric", "key", "value"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def fingerprint(aggregates: pd.DataFrame):
+    """
+    Returns a hash of the aggregate rows, used to skip unchanged districts.
+    """
+    rows = aggregates.sort_values(["metric", "key"])[["metric", "key", "value"]].itertuples(index=False)
+    return hashlib.sha1(repr([tuple(row) for row in rows]).encode("utf-8")).hexdigest()
+
+
+"""
+------------------------------------------------------------------------------
+Aggregates table
+------------------------------------------------------------------------------
+"""
+
+_lock = threading.Lock()
+
+
+def connect(path=AGGREGATES_FILE):
+    """
+    Opens the aggregates file, creating it and its tables if needed.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS aggregates (
+            district TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value REAL,
+            PRIMARY KEY (district, metric, key)
+        )""")
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS districts (
+            district TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )""")
+    return connection
+
+
+def update_district_aggregates(district, members, orgaData, agenda, path=AGGREGATES_FILE):
+    """
+    Computes the aggregates of a district and replaces its rows in the aggregates table
+    if they changed. Rows of the other districts are not touched.
+    Returns True if the district was updated.
+
+    Args:
+    - district: district name, e.g. 'Mitte'
+    - members, orgaData, agenda: complete data of the district (see district_aggregates)
+    - path: aggregates file
+    """
+    aggregates = district_aggregates(members, orgaData, agenda)
+    digest = fingerprint(aggregates)
+
+    with _lock:
+        connection = connect(path)
+        try:
+            row = connection.execute("SELECT fingerprint FROM districts WHERE district = ?", (district,)).fetchone()
+            if row is not None and row[0] == digest:
+                return False
+            with connection:
+                connection.execute("DELETE FROM aggregates WHERE district = ?", (district,))
+                connection.executemany(
+                    "INSERT INTO aggregates VALUES (?, ?, ?, ?)",
+                    [(district, metric, key, value) for metric, key, value in aggregates.itertuples(index=False)],
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO districts VALUES (?, ?, ?)",
+                    (district, digest, datetime.now(timezone.utc).isoformat(timespec="seconds")),
+                )
+        finally:
+            connection.close()
+    print(f"Aggregates of {district} updated")
+    return True
+
+
+def aggregates_version(path=AGGREGATES_FILE):
+    """
+    Returns the modification time of the aggregates file, or None if there is none.
+    Used as cache key so that updated aggregates are picked up immediately.
+    """
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+@st.cache_data(show_spinner=False)
+def load_aggregates(version, path=AGGREGATES_FILE):
+    """
+    Returns all aggregates (columns district, metric, key, value) and the update time per district,
+    or two empty data frames if there are none.
+
+    Args:
+    - version: version of the aggregates file (see aggregates_version), part of the cache key.
+    - path: aggregates file
+    """
+    if version is None:
+        return pd.DataFrame(columns=["district", "metric", "key", "value"]), pd.DataFrame(columns=["district", "updated_at"])
+    with _lock:
+        connection = connect(path)
+        try:
+            aggregates = pd.read_sql_query("SELECT district, metric, key, value FROM aggregates", connection)
+            districts = pd.read_sql_query("SELECT district, updated_at FROM districts ORDER BY district", connection)
+        finally:
+            connection.close()
+    return aggregates, districts
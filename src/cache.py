@@ -0,0 +1,279 @@
+"""
+------------------------------------------------------------------------------
+Libraries
+------------------------------------------------------------------------------
+"""
+
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from src.client import http_get
+from src.metrics import record_request
+
+
+"""
+------------------------------------------------------------------------------
+Settings
+------------------------------------------------------------------------------
+"""
+
+# SQLite file of the response cache, set BVV_CACHE_DIR to an empty string to disable it
+CACHE_DIR = os.environ.get("BVV_CACHE_DIR", ".cache")
+CACHE_FILE = "oparl.sqlite"
+
+# Byte budget of the cache (responses and list snapshots), least recently used entries are evicted beyond it
+MAX_BYTES = int(os.environ.get("BVV_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+
+# Time to live (in seconds) per OParl resource type
+HOUR = 60 * 60
+TTLS = {
+    "system": 7 * 24 * HOUR,
+    "body": 7 * 24 * HOUR,
+    "organization": 24 * HOUR,
+    "person": 24 * HOUR,
+    "membership": 24 * HOUR,
+    "meeting": 6 * HOUR,
+}
+DEFAULT_TTL = 24 * HOUR
+
+
+"""
+------------------------------------------------------------------------------
+Cache
+------------------------------------------------------------------------------
+"""
+
+_connection = None
+_lock = threading.Lock()
+
+
+def resource_type(url):
+    """
+    Returns the OParl resource type of a URL (e.g. 'person' for .../oparl/1.0/person.asp?body=1),
+    or None if it cannot be recognized.
+    """
+    path = url.split("?", 1)[0].lower()
+    for name in TTLS:
+        plural = "bodies" if name == "body" else f"{name}s"
+        if re.search(rf"/({name}|{plural})(\.asp|/|$)", path):
+            return name
+    return None
+
+
+def ttl_for(url):
+    """
+    Returns the time to live (in seconds) of a URL based on its resource type.
+    """
+    return TTLS.get(resource_type(url), DEFAULT_TTL)
+
+
+def get_connection():
+    """
+    Returns the shared SQLite connection, creating the cache file on first use.
+    Returns None if the cache is disabled.
+    """
+    global _connection
+    if not CACHE_DIR:
+        return None
+    if _connection is None:
+        with _lock:
+            if _connection is None:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                connection = sqlite3.connect(os.path.join(CACHE_DIR, CACHE_FILE), check_same_thread=False)
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS responses (
+                        url TEXT PRIMARY KEY,
+                        body BLOB NOT NULL,
+                        etag TEXT,
+                        last_modified TEXT,
+                        fetched_at REAL NOT NULL,
+                        accessed_at REAL NOT NULL,
+                        size INTEGER NOT NULL
+                    )""")
+                connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS snapshots (
+                        url TEXT PRIMARY KEY,
+                        synced_at TEXT NOT NULL,
+                        body BLOB NOT NULL
+                    )""")
+                connection.commit()
+                _connection = connection
+    return _connection
+
+
+def lookup(url):
+    """
+    Returns the cached entry of a URL as dict, or None if it is not cached.
+    """
+    connection = get_connection()
+    if connection is None:
+        return None
+    with _lock:
+        row = connection.execute(
+            "SELECT body, etag, last_modified, fetched_at FROM responses WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        connection.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        connection.commit()
+    body, etag, last_modified, fetched_at = row
+    return {"body": body, "etag": etag, "last_modified": last_modified, "fetched_at": fetched_at}
+
+
+def store(url, body, etag=None, last_modified=None):
+    """
+    Stores a response body (bytes) and its validators, then evicts
+    least recently used entries beyond the byte budget.
+    """
+    connection = get_connection()
+    if connection is None:
+        return
+    now = time.time()
+    with _lock:
+        connection.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (url, body, etag, last_modified, now, now, len(body)),
+        )
+        evict(connection)
+        connection.commit()
+
+
+def touch(url):
+    """
+    Marks a cached entry as fresh again after a '304 Not Modified' response.
+    """
+    connection = get_connection()
+    if connection is None:
+        return
+    now = time.time()
+    with _lock:
+        connection.execute("UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+        connection.commit()
+
+
+def evict(connection):
+    """
+    Deletes the least recently used responses until the cache, including the list snapshots,
+    fits into MAX_BYTES. Snapshots are only deleted (oldest sync first) if that is not enough,
+    as the next sync of their list then fetches all of it again.
+    Must be called while holding the lock.
+    """
+    responses = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    snapshots = connection.execute("SELECT COALESCE(SUM(LENGTH(body)), 0) FROM snapshots").fetchone()[0]
+    total = responses + snapshots
+    if total <= MAX_BYTES:
+        return
+    rows = connection.execute("SELECT url, size FROM responses ORDER BY accessed_at").fetchall()
+    for url, size in rows:
+        if total <= MAX_BYTES:
+            return
+        connection.execute("DELETE FROM responses WHERE url = ?", (url,))
+        total -= size
+    rows = connection.execute("SELECT url, LENGTH(body) FROM snapshots ORDER BY synced_at").fetchall()
+    for url, size in rows:
+        if total <= MAX_BYTES:
+            return
+        connection.execute("DELETE FROM snapshots WHERE url = ?", (url,))
+        total -= size
+
+
+def clear():
+    """
+    Deletes all cached responses.
+    """
+    connection = get_connection()
+    if connection is None:
+        return
+    with _lock:
+        connection.execute("DELETE FROM responses")
+        connection.commit()
+
+
+def load_snapshot(url):
+    """
+    Returns the local snapshot of a synchronized OParl list as dict with
+    'synced_at' (datetime) and 'frame' (data frame), or None if there is none or it cannot be read.
+    """
+    connection = get_connection()
+    if connection is None:
+        return None
+    with _lock:
+        row = connection.execute("SELECT synced_at, body FROM snapshots WHERE url = ?", (url,)).fetchone()
+    if row is None:
+        return None
+    synced_at, body = row
+    try:
+        frame = pd.read_parquet(io.BytesIO(body))
+    except Exception as e:
+        print(f"Ignoring unreadable snapshot of {url}: {e}")
+        return None
+    return {"synced_at": datetime.fromisoformat(synced_at), "frame": frame}
+
+
+def save_snapshot(url, frame, synced_at):
+    """
+    Stores the snapshot of a synchronized OParl list as Parquet, then evicts
+    least recently used entries beyond the byte budget (see evict).
+
+    Args:
+    - url: URL of the list
+    - frame: data frame of the list, e.g. the membership rows
+    - synced_at: datetime (UTC) the sync was started
+    """
+    connection = get_connection()
+    if connection is None:
+        return
+    body = frame.to_parquet(index=False)
+    with _lock:
+        connection.execute(
+            "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)", (url, synced_at.isoformat(), body)
+        )
+        evict(connection)
+        connection.commit()
+
+
+def get_json(url, max_age=None):
+    """
+    Returns the JSON of a URL, served from the disk cache while it is fresh.
+    Stale entries are revalidated with If-None-Match/If-Modified-Since.
+    Raises the requests exceptions of http_get/raise_for_status.
+
+    Args:
+    - url: request URL
+    - max_age: time to live in seconds, defaults to the TTL of the resource type.
+    """
+    if max_age is None:
+        max_age = ttl_for(url)
+
+    started = time.time()
+    entry = lookup(url)
+    if entry and time.time() - entry["fetched_at"] < max_age:
+        record_request(url, 200, len(entry["body"]), time.time() - started, "hit", started)
+        return json.loads(entry["body"])
+
+    # Conditional request for stale entries
+    headers = {}
+    if entry and entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry["last_modified"]:
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = http_get(url, headers=headers)
+    if response.status_code == 304 and entry:
+        touch(url)
+        return json.loads(entry["body"])
+
+    response.raise_for_status()
+    data = response.json()
+    store(url, response.content, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    return data
@@ -0,0 +1,139 @@
+"""
+------------------------------------------------------------------------------
+Libraries
+------------------------------------------------------------------------------
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.metrics import record_request
+from src.resilience import RETRY_STATUS, get_breaker, retry_after
+from src.scheduler import MAX_PER_HOST, get_scheduler
+
+
+"""
+------------------------------------------------------------------------------
+Settings
+------------------------------------------------------------------------------
+"""
+
+# Timeouts (in seconds) for connecting and reading, override via environment
+CONNECT_TIMEOUT = float(os.environ.get("BVV_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("BVV_READ_TIMEOUT", 30))
+
+HEADERS = {
+    "Accept": "application/json",
+    "Accept-Encoding": "gzip, deflate",
+    "User-Agent": "BVV-Berlin-App (+https://bvv-berlin.streamlit.app/)",
+}
+
+
+"""
+------------------------------------------------------------------------------
+Shared session
+------------------------------------------------------------------------------
+"""
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Returns the process-wide requests session. Connections are kept alive
+    and pooled per host, so repeated calls to the same district skip the TCP/TLS handshake.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.headers.update(HEADERS)
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=MAX_PER_HOST)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def http_get(url, timeout=None, **kwargs):
+    """
+    Sends a GET request through the shared session and returns the response.
+    Waits until the request scheduler lets the request through (per-host rate limit,
+    per-host and global concurrency, priority class, see src/scheduler.py).
+    Each request is recorded in the metrics.
+    Raises CircuitOpenError without sending the request if the host's circuit breaker is open.
+
+    Args:
+    - url: request URL
+    - timeout: (connect, read) timeout in seconds, defaults to the module settings.
+    - kwargs: passed on to requests (e.g. params, headers).
+    """
+    with http_request(url, timeout, stream=False, **kwargs) as response:
+        return response
+
+
+@contextmanager
+def http_stream(url, timeout=None, **kwargs):
+    """
+    Sends a streamed GET request and yields the response, whose body is read inside the with block.
+    Like http_get, but the scheduler slot is held and the circuit breaker is only updated until
+    the body was read, and the metrics record the bytes received. The response is closed on exit.
+
+    Args: see http_get
+    """
+    with http_request(url, timeout, stream=True, **kwargs) as response:
+        with response:
+            yield response
+
+
+@contextmanager
+def http_request(url, timeout, stream, **kwargs):
+    """
+    Sends a GET request within a scheduler slot and yields the response (see http_get and http_stream).
+    The slot is released, and the request recorded, when the with block exits.
+    """
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+    breaker = get_breaker(url)
+    breaker.allow()
+
+    scheduler = get_scheduler()
+    with scheduler.slot(url):
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            response = get_session().get(url, timeout=timeout, stream=stream, **kwargs)
+        except requests.RequestException:
+            breaker.record_failure()
+            record_request(url, "error", 0, time.perf_counter() - start, "miss", started)
+            raise
+
+        # Throttled by the server: lower the request rate to this host
+        if response.status_code == 429 or (response.status_code == 503 and "Retry-After" in response.headers):
+            scheduler.slow_down(url, retry_after(response))
+        elif response.ok:
+            scheduler.speed_up(url)
+
+        failed = False
+        try:
+            yield response
+        except Exception:
+            # Body could not be read (e.g. connection reset while streaming), not an error status
+            failed = response.ok
+            raise
+        finally:
+            if failed or response.status_code in RETRY_STATUS:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            size = response.raw.tell() if stream else len(response.content)
+            record_request(url, "error" if failed else response.status_code, size, time.perf_counter() - start,
+                           "miss", started)
@@ -6,13 +6,64 @@ Libraries
 
 import streamlit as st
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import requests
 import pandas as pd
 import numpy as np
-import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 
-from pandas import json_normalize
+from src.cache import get_json, load_snapshot, save_snapshot
+from src.intervals import MembershipIntervals
+from src.client import http_stream
+from src.resilience import IncompleteError, call_with_retries
+from src.scheduler import inherit_context
+
+try:
+    import ijson
+except ImportError:  # pages are parsed as a whole
+    ijson = None
+
+
+# Berlin districts with an OParl interface
+DISTRICTS = ["Mitte", "Charlottenburg-Wilmersdorf", "Friedrichshain-Kreuzberg","Lichtenberg", "Marzahn-Hellersdorf", "Neukoelln", "Pankow", "Reinickendorf", "Steglitz-Zehlendorf", "Tempelhof-Schoeneberg", "Treptow-Koepenick"]
+
+
+def system_url(district):
+    """
+    Returns the OParl system URL of a district (e.g. 'Mitte').
+    """
+    return f"https://www.sitzungsdienst-{district.lower()}.de/oi/oparl/1.0/system.asp"
+
+
+# Classifications of the BVV itself (used differently by the districts)
+BVV_CLASSIFICATIONS = ["BVV", "Bezirksparlament", "Bezirk", "Bezirksverordnetenversammlung", "Bezirksverordnete", "Parlament", "Stadtbezirk"]
+
+# Gender by form of address
+GENDER_MAPPING = {"Frau": "w", "Herr": "m"}
+
+# Name parts of factions (Fraktionen)
+FRAKTIONEN = {"Grünen", "Grüne", "SPD", "Linke","CDU", "FDP", "AFD", "BSW", "Fraktion "}
+
+# German stopwords excluded from the word cloud and the agenda search
+STOPWORDS = set([
+    "der", "die", "das", "und", "zur", "von", "den", "im", "des", "aus", "einer",
+    "zu", "auf", "für", "mit", "nicht", "bei", "über", "als", "es", "dem","eine",
+    "werden", "eine", "oder", "an", "ein", "haben", "nach", "mehr", "dass","ist",
+    "am", "in", "auch", "zum", "liegen", "keine", "wie", "ohne", "vor", "gegen",
+    "vom", "von", "beim", "kein"
+])
+
+# Elections to the Berlin BVVs (start of each election period)
+ELECTION_DATES = ["2006-09-17", "2011-09-18", "2016-09-18", "2021-09-26", "2023-02-12"]
+
+# Lifetime of the in-memory streamlit cache, the on-disk cache refills it
+CACHE_TTL = "1h"
+
+# Incremental sync of paginated lists
+FULL_SYNC_DAYS = 30
+SYNC_OVERLAP = timedelta(minutes=5)
 
 
 """
@@ -22,141 +73,841 @@ Functions
 """
 
 # Fetch api data
-@st.cache_data(show_spinner=True)
+@st.cache_data(show_spinner=True, ttl=CACHE_TTL)
 def fetch_data(url):
     """
     Fetches data from the base URL and returns it as JSON.
-    If an error occurs, returns None.
+    Fresh responses are served from the on-disk cache, failed requests are retried with backoff.
+    Errors are raised, so that they are not cached (see fetch_or_none).
     """
+    return call_with_retries(get_json, url)
+
+
+# Fetch a single page of a paginated api response
+def fetch_page(url, retries=3, delay=1, max_age=None, fields=None):
+    """
+    Fetches one page of a paginated response and returns it as JSON.
+    Returns None if the page could not be fetched.
+
+    Args:
+    - url: page URL
+    - retries: Max. number of attempts (see call_with_retries).
+    - delay: Base delay (in seconds) of the exponential backoff between attempts.
+    - max_age: Max. age (in seconds) of a cached response, defaults to the TTL of the resource type.
+    - fields: If given, only these fields of the list objects are kept and the page is
+      parsed while it is downloaded (see stream_page).
+    """
+    def get(url):
+        if fields and ijson is not None:
+            return stream_page(url, fields)
+        page = get_json(url, max_age)
+        if fields and "data" in page:
+            page["data"] = [trim(obj, fields) for obj in page["data"]]
+        return page
+
     try:
-        response = requests.get(url)
-        response.raise_for_status() 
-        data = response.json() 
-        return data
-    except requests.exceptions.RequestException as e:
-        print(f"An error occurred: {e}")
+        return call_with_retries(get, url, retries, delay)
+    except requests.RequestException as e:
+        print(f"Skipping URL {url}: {e}")
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+
+    return None
+
+
+def trim(obj, fields):
+    """
+    Returns the object with only the given fields (and 'id'/'deleted', needed for syncing).
+    fields may map a field to the fields of its nested objects, e.g. {'membership': ('role', 'startDate')}.
+    """
+    trimmed = {}
+    for key, value in obj.items():
+        if key in fields or key in ("id", "deleted"):
+            nested = fields.get(key) if isinstance(fields, dict) else None
+            if nested and isinstance(value, list):
+                value = [trim(item, nested) if isinstance(item, dict) else item for item in value]
+            trimmed[key] = value
+    return trimmed
+
+
+def stream_page(url, fields):
+    """
+    Downloads one page of an OParl list and parses it incrementally with ijson.
+    Each list object is reduced to the given fields as soon as it is complete,
+    so the full page is never held in memory as raw JSON. Bypasses the disk cache.
+    The scheduler slot of the request is held until the page is parsed (see http_stream).
+
+    Returns the page as dict with 'data', 'links' and 'pagination'.
+    """
+    page = {"data": [], "links": {}, "pagination": {}}
+    builder = None
+    with http_stream(url) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True  # gzip/deflate
+        for prefix, event, value in ijson.parse(response.raw):
+            if builder is not None:
+                if prefix == "data.item" and event == "end_map":
+                    page["data"].append(trim(builder.value, fields))
+                    builder = None
+                else:
+                    builder.event(event, value)
+            elif prefix == "data.item" and event == "start_map":
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+            elif prefix.startswith("links.") and event == "string":
+                page["links"][prefix[len("links."):]] = value
+            elif prefix.startswith("pagination.") and event == "number":
+                page["pagination"][prefix[len("pagination."):]] = int(value)
+    return page
+
+
+def page_urls(first_page):
+    """
+    Derives the URLs of all remaining pages from the first page of an OParl list
+    and returns them in page order. Returns None if the server does not report
+    a page count or the page parameter cannot be identified.
+
+    Args: first_page (dict): JSON of the first page with 'links' and 'pagination'.
+    """
+    links = first_page.get("links", {})
+    pagination = first_page.get("pagination", {})
+    next_url = links.get("next")
+    if not next_url:
+        return []
+
+    total_pages = pagination.get("totalPages")
+    current_page = pagination.get("currentPage", 1)
+
+    # Fall back to the page number in the 'last' link
+    split_next = urlsplit(next_url)
+    next_query = parse_qsl(split_next.query, keep_blank_values=True)
+    if not total_pages and links.get("last"):
+        last_query = dict(parse_qsl(urlsplit(links["last"]).query))
+        total_pages = next((last_query[key] for key, value in next_query
+                            if key in last_query and value == str(current_page + 1)), None)
+
+    try:
+        total_pages = int(total_pages)
+        current_page = int(current_page)
+    except (TypeError, ValueError):
         return None
 
+    # Query parameter that carries the page number in the 'next' link
+    page_keys = [key for key, value in next_query if value == str(current_page + 1)]
+    if len(page_keys) != 1:
+        return None
+    page_key = page_keys[0]
+
+    urls = []
+    for page in range(current_page + 1, total_pages + 1):
+        query = [(key, str(page) if key == page_key else value) for key, value in next_query]
+        urls.append(urlunsplit(split_next._replace(query=urlencode(query))))
+    return urls
+
+
+def iter_pages(url, retries=3, delay=1, max_workers=4, max_age=None, fields=None):
+    """
+    Yields the pages of a paginated response in page order.
+    If the first page reports the number of pages, the following pages are prefetched
+    concurrently (at most 2 * max_workers pages ahead), otherwise the 'next' links
+    are followed one by one.
+    If a page fails, IncompleteError is raised after the pages before it,
+    instead of silently ending the list.
+
+    Args:
+    - base URL
+    - retries: Max. number of attempts per page (see call_with_retries).
+    - delay: Base delay (in seconds) of the exponential backoff between attempts.
+    - max_workers: Number of pages fetched at the same time.
+    - max_age: Max. age (in seconds) of cached pages, defaults to the TTL of the resource type.
+    - fields: Fields of the list objects to keep (see fetch_page), default all.
+    """
+    list_url = url
+    first_page = fetch_page(url, retries, delay, max_age, fields)
+    if not first_page or "data" not in first_page:
+        raise IncompleteError(list_url, [url])
+    yield first_page
+
+    url = first_page.get("links", {}).get("next")
+    remaining_urls = page_urls(first_page)
+
+    if remaining_urls is not None:
+        with ThreadPoolExecutor(max_workers=max_workers, initializer=inherit_context()) as executor:
+            remaining_urls = iter(remaining_urls)
+            pending = deque()
+
+            def prefetch():
+                page_url = next(remaining_urls, None)
+                if page_url:
+                    pending.append((page_url, executor.submit(fetch_page, page_url, retries, delay, max_age, fields)))
+
+            for _ in range(2 * max_workers):
+                prefetch()
+
+            url = None
+            while pending:
+                page_url, future = pending.popleft()
+                page = future.result()
+                if not page or "data" not in page:
+                    # Continue from the failed page by following the 'next' links
+                    print(f"Concurrent pagination incomplete for URL {page_url}, following next links instead.")
+                    for _, future in pending:
+                        future.cancel()
+                    url = page_url
+                    break
+                prefetch()
+                yield page
+
+    # Sequential chaining via the 'next' link
+    while url:
+        page = fetch_page(url, retries, delay, max_age, fields)
+        if not page or "data" not in page:
+            raise IncompleteError(list_url, [url])
+        yield page
+        url = page.get("links", {}).get("next")  # Get the next page URL
+
+
+def fetch_all_pages(url, retries=3, delay=1, max_workers=4, max_age=None, fields=None):
+    """
+    Fetch paginated data from the base URL and returns
+    a list containing all the data from the paginated responses.
+
+    Args: see iter_pages
+
+    Raises IncompleteError with the objects fetched so far if a page failed.
+    """
+    all_data = []
+    try:
+        for page in iter_pages(url, retries, delay, max_workers, max_age, fields):
+            all_data.extend(page["data"])  # Add data of the current page
+    except IncompleteError as e:
+        raise e.with_partial(all_data)
+    return all_data
+
 
 # Fetch paginated api data
-@st.cache_data(show_spinner=True)
-def fetch_pag_data(url, retries=2, delay=3):
+@st.cache_data(show_spinner=True, ttl=CACHE_TTL)
+def fetch_pag_data(url, retries=3, delay=1, max_workers=4):
     """
     Fetch paginated data from the base URL and returns
     a list containing all the data from the paginated responses.
+    Incomplete lists raise IncompleteError and are not cached (see fetch_or_partial).
 
     Args:
     - base URL
-    - retries: The number of times to retry in case of an error.
-    - delay: Delay (in seconds) between retries.
+    - retries: Max. number of attempts per page (see call_with_retries).
+    - delay: Base delay (in seconds) of the exponential backoff between attempts.
+    - max_workers: Number of pages fetched at the same time.
     """
-    all_data = []
+    return fetch_all_pages(url, retries, delay, max_workers)
 
-    while url:
-        for attempt in range(retries):
-            try:
-                response = requests.get(url)
-                response.raise_for_status()  
-                data = response.json()  
-
-                if "data" in data:
-                    all_data.extend(data["data"])  # Add data of the current page
-                    url = data.get("links", {}).get("next")  # Get the next page URL
-                else:
-                    url = None  # No more data
-                break  
 
-            except requests.HTTPError as e:
-                print(f"Attempt {attempt + 1} failed for URL {url}: {e}")
-                if attempt < retries - 1:
-                    time.sleep(delay)
-                else:
-                    print(f"Failed after {retries} attempts. Skipping URL: {url}")
-                    url = None  # No more data
-                    break
-            except Exception as e:
-                print(f"Unexpected error: {e}")
-                url = None
-                break
+def fetch_or_partial(fetch, *args, **kwargs):
+    """
+    Calls a cached fetch function. If the data could only be fetched partially (IncompleteError),
+    shows a warning and returns the partial data, which is not cached, so the next rerun tries again.
 
-    return all_data
+    Args:
+    - fetch: fetch function, e.g. fetch_membership_data
+    - args, kwargs: passed on to the fetch function
+    """
+    try:
+        return fetch(*args, **kwargs)
+    except IncompleteError as e:
+        print(f"Incomplete data: {e}")
+        st.warning(f"Die Daten konnten nicht vollständig geladen werden ({len(e.failed_urls)} fehlgeschlagene Anfragen). "
+                   "Es werden die bisher geladenen Daten angezeigt.")
+        return e.partial
 
 
-# Fetch organization api data
-@st.cache_data(show_spinner=True)
-def fetch_orga_data(persons_with_membership: pd.DataFrame):
+def fetch_or_none(fetch, *args, **kwargs):
+    """
+    Calls a cached fetch function and returns None if it fails. The error is not cached,
+    so the next rerun tries again.
+
+    Args:
+    - fetch: fetch function, e.g. fetch_data
+    - args, kwargs: passed on to the fetch function
+    """
+    try:
+        return fetch(*args, **kwargs)
+    except (requests.RequestException, ValueError) as e:
+        print(f"An error occurred: {e}")
+        return None
+
+
+def with_query(url, **params):
+    """
+    Returns the URL with the given query parameters added or replaced.
+    """
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key not in params]
+    query.extend(params.items())
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+# Membership and person fields used by the app, memberships are reduced to MEMBERSHIP_FIELDS while parsing
+MEMBERSHIP_FIELDS = ("id", "organization", "role", "votingRight", "startDate", "endDate", "onBehalfOf")
+PERSON_FIELDS = {"name": None, "familyName": None, "givenName": None, "formOfAddress": None,
+                 "membership": MEMBERSHIP_FIELDS}
+
+# Memberships flattened into one data frame at a time while the person list is synchronized
+FLATTEN_ROWS = 2000
+
+# Membership columns and types (see membership_frame)
+MEMBERSHIP_COLUMNS = {
+    "id": "string",
+    "organization": "string",
+    "role": "string",
+    "votingRight": "boolean",
+    "startDate": "string",
+    "endDate": "string",
+    "onBehalfOf": "string",
+    "name": "string",
+    "familyName": "string",
+    "givenName": "string",
+    "formOfAddress": "string",
+    "person": "string",
+}
+
+
+def sync_memberships(url, full_sync_days=FULL_SYNC_DAYS):
+    """
+    Synchronizes the person list with its local snapshot and returns the membership data frame.
+    Each page is reduced to PERSON_FIELDS while it is parsed and its persons are flattened into
+    membership rows in batches of about FLATTEN_ROWS, so apart from the rows only a few pages of
+    trimmed persons are held in memory at a time.
+    The snapshot stores the membership rows: after the first full download only persons modified
+    since the last sync are requested ('modified_since' parameter) and their rows replace the old ones,
+    rows of deleted persons are removed.
+    If the list cannot be fetched completely, the snapshot is left unchanged and IncompleteError
+    is raised with the previous snapshot (or, without one, the rows fetched so far) as partial data.
+
+    Args:
+    - url: URL of the body's person list.
+    - full_sync_days: Days after which the complete list is downloaded again.
+    """
+    snapshot_key = f"{url}#memberships"
+    snapshot = load_snapshot(snapshot_key)
+
+    # Overlap with the previous sync to tolerate clock differences to the server
+    sync_started = datetime.now(timezone.utc) - SYNC_OVERLAP
+    incremental = snapshot is not None and sync_started - snapshot["synced_at"] < timedelta(days=full_sync_days)
+    if incremental:
+        list_url = with_query(url, modified_since=snapshot["synced_at"].isoformat(timespec="seconds"))
+    else:
+        list_url = url
+
+    frames = []
+    pending, pending_rows = [], 0  # persons not flattened yet
+    changed = set()  # ids of the changed and deleted persons, if incremental
+    try:
+        for page in iter_pages(list_url, max_age=0, fields=PERSON_FIELDS):
+            for person in page["data"]:
+                if "id" not in person:
+                    continue
+                if incremental:
+                    changed.add(person["id"])
+                if not person.get("deleted"):
+                    pending.append(person)
+                    pending_rows += len(person.get("membership") or [])
+            if pending_rows >= FLATTEN_ROWS:
+                frames.append(membership_frame(pending))
+                pending, pending_rows = [], 0
+    except IncompleteError as e:
+        raise e.with_partial(snapshot["frame"] if snapshot else concat_frames(frames + [membership_frame(pending)]))
+    frames.append(membership_frame(pending))
+
+    if incremental:
+        previous = snapshot["frame"]
+        frames.insert(0, previous[~previous["person"].isin(changed)])
+
+    # Persons listed twice (e.g. pages shifted during the download) keep their last version
+    memberships = concat_frames(frames)
+    duplicated = memberships.duplicated(["person", "id"], keep="last")
+    if duplicated.any():
+        memberships = memberships[~duplicated].reset_index(drop=True)
+
+    save_snapshot(snapshot_key, memberships, sync_started)
+    return memberships
+
+
+def concat_frames(frames):
+    """
+    Concatenates membership data frames, returns an empty one with the membership columns if there are none.
+    """
+    if not frames:
+        return membership_frame([])
+    return pd.concat(frames, ignore_index=True)
+
+
+# Organization columns and types
+ORGA_COLUMNS = {
+    "organization": "string",
+    "orgaName": "string",
+    "shortName": "string",
+    "orgaType": "string",
+    "classification": "string",
+    "orga_startDate": "datetime64",
+    "orga_endDate": "datetime64",
+}
+
+
+def orga_record(orga_data):
+    """
+    Maps an OParl organization object to a row of the orga data frame.
+    """
+    return {
+        "organization": orga_data.get("id"),
+        "orgaName": orga_data.get("name"),
+        "shortName": orga_data.get("shortName"),
+        "orgaType": orga_data.get("organizationType"),
+        "classification": orga_data.get("classification"),
+        "orga_startDate": orga_data.get("startDate"),
+        "orga_endDate": orga_data.get("endDate"),
+    }
+
+
+def resolve_orga_data(persons_with_membership: pd.DataFrame, organization_url=None, max_workers=8):
     """
     Fetches and processes organization data based on unique URLs in the organization column
     and returs a data frame with the orga data.
+    Organizations are first looked up in the body's paginated organization list,
+    the remaining URLs are fetched individually and concurrently.
+    Raises IncompleteError with the data frame of the fetched organizations if some could not be fetched.
 
-    Args: DataFrame with an organization column containing the URLs.
+    Args:
+    - DataFrame with an organization column containing the URLs.
+    - organization_url: URL of the body's organization list (optional).
+    - max_workers: Number of organizations fetched at the same time.
     """
     # Extract unique URLs
     unique_orga_urls = persons_with_membership["organization"].dropna().unique()
-    
-    data_list = []
 
-    for orga_url in unique_orga_urls:
+    # Bulk lookup in the organization list
+    orga_by_url = {}
+    if organization_url:
         try:
-            orga_data = fetch_data(orga_url)
+            orga_list = fetch_all_pages(organization_url)
+        except IncompleteError as e:
+            orga_list = e.partial  # the rest is fetched individually below
+        for orga_data in orga_list:
+            if orga_data.get("id") and not orga_data.get("deleted"):
+                orga_by_url[orga_data["id"]] = orga_data
 
-            if orga_data: 
-                data = {
-                    "organization": orga_data.get("id"),
-                    "orgaName": orga_data.get("name"),
-                    "shortName": orga_data.get("shortName"),
-                    "orgaType": orga_data.get("organizationType"),
-                    "classification": orga_data.get("classification"),
-                    "orga_startDate": orga_data.get("startDate"),
-                    "orga_endDate": orga_data.get("endDate"),
-                }
+    missing_urls = [orga_url for orga_url in unique_orga_urls if orga_url not in orga_by_url]
+
+    # Fetch missing organizations one by one, in parallel
+    failed_urls = []
+    if missing_urls:
+        with ThreadPoolExecutor(max_workers=max_workers, initializer=inherit_context()) as executor:
+            for orga_url, orga_data in zip(missing_urls, executor.map(fetch_page, missing_urls)):
+                if orga_data:
+                    orga_by_url[orga_url] = orga_data
+                else:
+                    print(f"Error fetching data from {orga_url}")
+                    failed_urls.append(orga_url)
 
-                data_list.append(data)
+    data_list = [orga_record(orga_by_url[orga_url]) for orga_url in unique_orga_urls if orga_url in orga_by_url]
 
-        except Exception as e:
-            print(f"Error fetching data from {orga_url}: {e}")
+    orgaData = pd.DataFrame(data_list, columns=list(ORGA_COLUMNS))
+    for column, dtype in ORGA_COLUMNS.items():
+        if dtype.startswith("datetime"):
+            orgaData[column] = pd.to_datetime(orgaData[column], format="ISO8601", errors="coerce")
+        else:
+            orgaData[column] = orgaData[column].astype(dtype)
 
-    orgaData = pd.DataFrame(data_list)
+    if failed_urls:
+        raise IncompleteError(organization_url or "organizations", failed_urls, orgaData)
     return orgaData
 
 
-# Fetch agenda api data
-@st.cache_data(show_spinner=True)
-def fetch_agenda_data(meeting_data):
+# Fetch organization api data
+@st.cache_data(show_spinner=True, ttl=CACHE_TTL)
+def fetch_orga_data(persons_with_membership: pd.DataFrame, organization_url=None, max_workers=8):
+    """
+    Fetches the organizations referenced in the organization column and returns them as data frame.
+
+    Args:
+    - DataFrame with an organization column containing the URLs.
+    - organization_url: URL of the body's organization list (optional).
+    - max_workers: Number of organizations fetched at the same time.
+    """
+    return resolve_orga_data(persons_with_membership, organization_url, max_workers)
+
+
+def membership_frame(persons):
+    """
+    Builds the membership data frame (one row per membership with the MEMBERSHIP_FIELDS,
+    the person's name, familyName, givenName, formOfAddress and its URL, see MEMBERSHIP_COLUMNS)
+    column by column from an iterable of OParl person objects, e.g. one page of the person list.
+
+    Args: persons: iterable of OParl person objects.
+    """
+    person_columns = [field for field in PERSON_FIELDS if field != "membership"]
+    columns = {column: [] for column in MEMBERSHIP_COLUMNS}
+
+    for person in persons:
+        for membership in person.get("membership") or []:
+            if not isinstance(membership, dict):
+                continue
+            for field in MEMBERSHIP_FIELDS:
+                columns[field].append(membership.get(field))
+            for field in person_columns:
+                columns[field].append(person.get(field))
+            columns["person"].append(person.get("id"))
+
+    memberships = pd.DataFrame(columns)
+    for column, dtype in MEMBERSHIP_COLUMNS.items():
+        memberships[column] = memberships[column].astype(dtype)
+    return memberships
+
+
+# Fetch person api data
+@st.cache_data(show_spinner=True, ttl=CACHE_TTL)
+def fetch_membership_data(personUrl):
     """
-    Processes meeting data and extracts agenda items and returns
-    a list of dictionaries with processed meeting details, including agenda items.
+    Synchronizes the person list (only the fields in PERSON_FIELDS) and returns the membership data frame.
+    Raises IncompleteError with the partial data frame if the list could not be fetched completely.
 
-    Args: meeting_data (dict): Dictionary containing meeting data with a 'data' key holding a list of meetings.
+    Args: personUrl: URL of the body's person list
+    """
+    return sync_memberships(personUrl)
+
+
+def members_table(persons_with_membership: pd.DataFrame, orgaData: pd.DataFrame):
+    """
+    Joins the memberships with their organizations once and returns a compact data frame:
+    person and organization URLs are interned as integer keys (person_key, orga_key),
+    repeated strings are categoricals and all dates are parsed to datetime64.
+    orga_current marks memberships in organizations that have not ended.
+
+    Args:
+    - persons_with_membership: membership data frame (see membership_frame)
+    - orgaData: organization data frame (see resolve_orga_data)
+    """
+    memberships = persons_with_membership
+    orgaData = orgaData.drop_duplicates("organization")
+
+    # Integer keys for the URLs, organizations share the codes of orgaData
+    orga_key, orga_urls = pd.factorize(pd.concat([orgaData["organization"].astype(object),
+                                                  memberships["organization"].astype(object)]))
+    person_key, _ = pd.factorize(memberships["person"] if "person" in memberships else memberships["name"])
+
+    members = pd.DataFrame({
+        "person_key": person_key.astype("int32"),
+        "orga_key": orga_key[len(orgaData):].astype("int32"),  # -1 without organization
+        "organization": pd.Categorical(memberships["organization"]),
+        "role": pd.Categorical(memberships["role"]),
+        "votingRight": memberships["votingRight"].astype("boolean"),
+        "startDate": pd.to_datetime(memberships["startDate"], format="ISO8601", errors="coerce"),
+        "endDate": pd.to_datetime(memberships["endDate"], format="ISO8601", errors="coerce"),
+        "name": pd.Categorical(memberships["name"]),
+        "familyName": pd.Categorical(memberships["familyName"]),
+        "givenName": pd.Categorical(memberships["givenName"]),
+        "formOfAddress": pd.Categorical(memberships["formOfAddress"].str.strip()),
+    })
+
+    # Organization columns, looked up by key instead of a merge on URLs
+    orgas = pd.DataFrame({
+        "orgaName": pd.Categorical(orgaData["orgaName"]),
+        "shortName": pd.Categorical(orgaData["shortName"]),
+        "orgaType": pd.Categorical(orgaData["orgaType"]),
+        "classification": pd.Categorical(orgaData["classification"]),
+        "orga_startDate": pd.to_datetime(orgaData["orga_startDate"], errors="coerce"),
+        "orga_endDate": pd.to_datetime(orgaData["orga_endDate"], errors="coerce"),
+    }, index=orga_key[:len(orgaData)]).reindex(members["orga_key"]).reset_index(drop=True)
+
+    members = pd.concat([members, orgas], axis=1)
+    members["orga_current"] = members["orga_key"].isin(orga_key[:len(orgaData)]) & members["orga_endDate"].isna()
+    return members
+
+
+# Join memberships and organizations
+@st.cache_data(show_spinner=False, ttl=CACHE_TTL)
+def build_members(persons_with_membership: pd.DataFrame, orgaData: pd.DataFrame):
+    """
+    Cached members_table, built once per dataset.
+    """
+    return members_table(persons_with_membership, orgaData)
+
+
+def organization_index(orgaData: pd.DataFrame, currentMembers: pd.DataFrame):
+    """
+    Groups the current members by organization id and returns one row per organization
+    (in the order of orgaData) with its member count, the member list as text ('Name (Rolle), ...')
+    and whether it is a faction. label is the organization name, with the short name added
+    if several organizations share the name.
+
+    Args:
+    - orgaData: organizations to show (e.g. the current ones)
+    - currentMembers: current memberships (see members_table)
+    """
+    orgas = orgaData.drop_duplicates("organization").reset_index(drop=True)
+
+    # Members grouped by organization URL, in membership order
+    current = currentMembers[currentMembers["organization"].notna()]
+    member_text = (current["name"].astype("string").fillna("") + " ("
+                   + current["role"].astype("string").fillna("") + ")")
+    grouped = member_text.groupby(current["organization"].astype(object).values, sort=False)
+    member_lists = grouped.agg(", ".join)
+    member_counts = grouped.size()
+
+    names = orgas["orgaName"].astype("string")
+    duplicated = names.duplicated(keep=False)
+    urls = orgas["organization"].astype(object)
+
+    return pd.DataFrame({
+        "organization": urls,
+        "orgaName": names,
+        "shortName": orgas["shortName"],
+        "orgaType": orgas["orgaType"],
+        "classification": orgas["classification"],
+        "label": names.where(~duplicated, names + " (" + orgas["shortName"].astype("string").fillna("") + ")"),
+        "noMembers": urls.map(member_counts).fillna(0).astype(int),
+        "memberList": urls.map(member_lists),
+        "isFaction": names.fillna("").str.lower().apply(lambda name: any(f.lower() in name for f in FRAKTIONEN)),
+    })
+
+
+# Group members by organization
+@st.cache_data(show_spinner=False, ttl=CACHE_TTL)
+def build_organization_index(orgaData: pd.DataFrame, currentMembers: pd.DataFrame):
+    """
+    Cached organization_index, built once per dataset.
+    """
+    return organization_index(orgaData, currentMembers)
+
+
+def location_description(location):
+    """
+    Returns the description of an OParl location object, or 'unbekannt'.
+    """
+    return (location or {}).get("description") or "unbekannt"
+
+
+def resolve_locations(location_urls, max_workers=8):
+    """
+    Fetches linked OParl location objects concurrently and returns them by URL.
+    """
+    location_urls = list(location_urls)
+    if not location_urls:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_workers, initializer=inherit_context()) as executor:
+        return {url: location for url, location in zip(location_urls, executor.map(fetch_page, location_urls)) if location}
+
+
+# Fetch meeting locations
+@st.cache_data(show_spinner=False, ttl=CACHE_TTL)
+def fetch_meeting_locations(meeting_urls, max_workers=8):
+    """
+    Fetches the given meetings concurrently and returns their location descriptions by meeting URL.
+    Used for meetings whose list entries do not include the location.
+
+    Args:
+    - meeting_urls (tuple): meeting URLs
+    - max_workers: Number of meetings fetched at the same time.
+    """
+    meeting_urls = list(meeting_urls)
+    if not meeting_urls:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max_workers, initializer=inherit_context()) as executor:
+        meetings = list(executor.map(fetch_page, meeting_urls))
+
+    # Linked locations of the fetched meetings
+    linked_locations = resolve_locations({meeting["location"] for meeting in meetings
+                                          if meeting and isinstance(meeting.get("location"), str)})
+
+    locations = {}
+    for url, meeting in zip(meeting_urls, meetings):
+        if meeting is None:
+            print(f"Failed to fetch location for meeting {url}")
+            continue
+        location = meeting.get("location")
+        if isinstance(location, str):
+            location = linked_locations.get(location)
+        locations[url] = location_description(location)
+    return locations
+
+
+# Agenda item columns and types
+AGENDA_COLUMNS = {
+    "meeting": "category",
+    "meetingName": "category",
+    "start": "datetime64",
+    "end": "datetime64",
+    "location": "category",
+    "number": "string",
+    "name": "string",
+    "public": "boolean",
+}
+
+# Time zone of the meeting dates
+TIMEZONE = "Europe/Berlin"
+
+
+def to_timestamp(value):
+    """
+    Parses an OParl date(time) into a timestamp in the local time zone, or None.
     """
     try:
-        # Validate the input data
-        if not isinstance(meeting_data, dict) or "data" not in meeting_data:
-            raise ValueError("Invalid meeting data format. Expected a dictionary with a 'data' key.")
+        timestamp = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        return None
+    if pd.isna(timestamp):
+        return None
+    return timestamp.tz_localize(TIMEZONE) if timestamp.tzinfo is None else timestamp.tz_convert(TIMEZONE)
+
+
+def agenda_frame(meeting_pages, since=None, until=None):
+    """
+    Builds a flat data frame with one row per agenda item from pages of an OParl meeting list.
+    Pages are processed one at a time, so only the rows are kept in memory.
+    If the pages end with IncompleteError, it is raised with the data frame of the rows so far.
+
+    Args:
+    - meeting_pages: iterable of meeting list pages (dicts with a 'data' key), e.g. iter_pages(meetingUrl).
+    - since, until: optional date window on the meeting start (e.g. '2020-01-01').
+    """
+    since = to_timestamp(since) if since is not None else None
+    until = to_timestamp(until) if until is not None else None
+
+    columns = {column: [] for column in AGENDA_COLUMNS}
+    location_urls = set()
+
+    incomplete = None
+    try:
+        for page in meeting_pages:
+            for meeting in page.get("data", []):
+                start = to_timestamp(meeting.get("start"))
+                if (since is not None or until is not None) and start is None:
+                    continue
+                if (since is not None and start < since) or (until is not None and start > until):
+                    continue
+
+                # Embedded locations are described directly, linked ones are resolved below
+                location = meeting.get("location")
+                if isinstance(location, str):
+                    location_urls.add(location)
+                elif "location" in meeting:
+                    location = location_description(location)
+
+                for agenda_item in meeting.get("agendaItem", []):
+                    columns["meeting"].append(meeting.get("id"))
+                    columns["meetingName"].append(meeting.get("name"))
+                    columns["start"].append(start)
+                    columns["end"].append(to_timestamp(meeting.get("end")))
+                    # None if the meeting list does not include the location
+                    columns["location"].append(location)
+                    columns["number"].append(agenda_item.get("number"))
+                    columns["name"].append(agenda_item.get("name"))
+                    columns["public"].append(agenda_item.get("public", False))
+    except IncompleteError as e:
+        incomplete = e
+
+    if location_urls:
+        linked_locations = resolve_locations(location_urls)
+        columns["location"] = [
+            location_description(linked_locations.get(location)) if location in location_urls else location
+            for location in columns["location"]
+        ]
 
-        meetings_with_agenda = []
+    agendaItems = pd.DataFrame(columns)
+    for column, dtype in AGENDA_COLUMNS.items():
+        if dtype == "datetime64":
+            agendaItems[column] = pd.to_datetime(agendaItems[column], utc=True).dt.tz_convert(TIMEZONE)
+        else:
+            agendaItems[column] = agendaItems[column].astype(dtype)
 
-        for meeting in meeting_data.get("data", []):
-            meeting_info = {
-                "id": meeting.get("id"),
-                "name": meeting.get("name"),
-                "start": meeting.get("start"),
-                "end": meeting.get("end"),
-                "agendaItems": []
-            }
+    if incomplete:
+        raise incomplete.with_partial(agendaItems)
+    return agendaItems
 
-            for agenda_item in meeting.get("agendaItem", []):
-                agenda = {
-                    "number": agenda_item.get("number"),
-                    "name": agenda_item.get("name"),
-                    "public": agenda_item.get("public", False)
-                }
-                meeting_info["agendaItems"].append(agenda) 
 
-            meetings_with_agenda.append(meeting_info) 
+# Fetch agenda api data
+@st.cache_data(show_spinner=True, ttl=CACHE_TTL)
+def fetch_agenda_data(meetingUrl, since=None, until=None):
+    """
+    Fetches all pages of the meeting list and returns the agenda items as data frame
+    (see AGENDA_COLUMNS), optionally limited to meetings starting within a date window.
 
-        return meetings_with_agenda
+    Args:
+    - meetingUrl: URL of the body's meeting list
+    - since, until: optional date window on the meeting start (e.g. '2020-01-01').
+    """
+    try:
+        return agenda_frame(iter_pages(meetingUrl), since, until)
 
+    except IncompleteError:
+        raise  # not cached, see fetch_or_partial
     except Exception as e:
         st.error(f"An error occurred while processing the agenda data: {e}")
-        return [] # Return empty list in case of error
+        return agenda_frame([]) # Return empty data frame in case of error
+
+
+"""
+------------------------------------------------------------------------------
+Analytics
+------------------------------------------------------------------------------
+"""
+
+def period_bins(first_date, last_date, freq="Y"):
+    """
+    Returns the start dates and labels of the periods between two dates.
+
+    Args:
+    - first_date, last_date: Timestamps of the first and last day to cover.
+    - freq: 'Y' (years), 'Q' (quarters), 'M' (months) or 'election' (election periods).
+    """
+    if freq == "election":
+        elections = pd.to_datetime(ELECTION_DATES)
+        boundaries = pd.DatetimeIndex([first_date]).append(elections[(elections > first_date) & (elections <= last_date)])
+        return boundaries, boundaries.strftime("%Y-%m-%d")
+
+    periods = pd.period_range(first_date, last_date, freq=freq)
+    labels = periods.year if freq == "Y" else periods.astype(str)
+    return periods.start_time, labels
+
+
+def gender_over_time(memberships: pd.DataFrame, freq="Y", until=None):
+    """
+    Counts the active members by gender per period with the membership interval index and returns
+    a data frame with the columns Zeitraum, Anteil Frauen %, Anteil Männer %, Anzahl Frauen and Anzahl Männer.
+    A membership is active in every period from the one containing its startDate
+    up to the one containing its endDate (or until, if it has not ended).
+
+    Args:
+    - memberships: DataFrame with startDate, endDate and formOfAddress columns.
+    - freq: 'Y' (years), 'Q' (quarters), 'M' (months) or 'election' (election periods).
+    - until: last day to cover, defaults to today.
+    """
+    columns = ["Zeitraum", "Anteil Frauen %", "Anteil Männer %", "Anzahl Frauen", "Anzahl Männer"]
+
+    start = pd.to_datetime(memberships["startDate"], errors="coerce")
+    gender = memberships["formOfAddress"].str.strip().map(GENDER_MAPPING)
+
+    # Memberships without start date are never active
+    valid = start.notna().to_numpy()
+    if not valid.any():
+        return pd.DataFrame(columns=columns)
+
+    until = pd.Timestamp(until) if until is not None else pd.Timestamp("today").normalize()
+    boundaries, labels = period_bins(start[valid].min(), until, freq)
+
+    # Active memberships per period and gender from the interval index
+    counts = MembershipIntervals(memberships[valid]).count_active(boundaries, gender[valid].to_numpy(), until)
+    counts = {code: counts.get(code, np.zeros(len(boundaries), dtype=np.int64)) for code in ("w", "m")}
+
+    total = counts["w"] + counts["m"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        perc_fem = np.where(total > 0, np.round(counts["w"] / total, 3) * 100, 0)
+        perc_mal = np.where(total > 0, np.round(counts["m"] / total, 3) * 100, 0)
+
+    return pd.DataFrame({
+        "Zeitraum": labels,
+        "Anteil Frauen %": perc_fem,
+        "Anteil Männer %": perc_mal,
+        "Anzahl Frauen": counts["w"],
+        "Anzahl Männer": counts["m"],
+    })
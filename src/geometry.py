@@ -0,0 +1,122 @@
+"""
+------------------------------------------------------------------------------
+Precomputed district geometries
+
+The simplified geometries are generated once from the full-resolution WKT file:
+    python -m src.geometry
+------------------------------------------------------------------------------
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+import streamlit as st
+
+
+# Full-resolution district geometries (WKT), see BVV_app.py for the source
+SOURCE_CSV = "./csv/berlin_bezirke.csv"
+
+# One JSON file per district with the simplified GeoJSON geometries and the bounding box
+GEOMETRY_DIR = "./csv/berlin_bezirke"
+
+# Simplification tolerances (in degrees) and the min. map zoom they are used from
+LEVELS = {
+    "coarse": (0.002, 0),
+    "medium": (0.0005, 11),
+    "detail": (0.0001, 13),
+}
+
+# Decimal places of the stored coordinates (~1 m)
+PRECISION = 5
+
+
+"""
+------------------------------------------------------------------------------
+Precomputation
+------------------------------------------------------------------------------
+"""
+
+def simplify_district(geometry):
+    """
+    Returns the bounding box and the topology-preserving simplified GeoJSON
+    of a shapely geometry for every level.
+    """
+    import shapely
+    from shapely.geometry import mapping
+
+    levels = {}
+    for level, (tolerance, _) in LEVELS.items():
+        simplified = geometry.simplify(tolerance, preserve_topology=True)
+        simplified = shapely.transform(simplified, lambda coords: np.round(coords, PRECISION))
+        levels[level] = mapping(simplified)
+
+    return {"bbox": [round(value, PRECISION) for value in geometry.bounds], "levels": levels}
+
+
+def precompute(source_csv=SOURCE_CSV, geometry_dir=GEOMETRY_DIR):
+    """
+    Reads the WKT geometries and writes one compact JSON file per district.
+    """
+    import pandas as pd
+    from shapely import wkt
+
+    bezirke = pd.read_csv(source_csv)
+    os.makedirs(geometry_dir, exist_ok=True)
+
+    for name, geometry in zip(bezirke["namgem"], bezirke["geometry"]):
+        district = simplify_district(wkt.loads(geometry))
+        district["namgem"] = name
+        with open(os.path.join(geometry_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(district, f, separators=(",", ":"))
+        print(f"{name}: {os.path.getsize(os.path.join(geometry_dir, f'{name}.json')) / 1024:.0f} kB")
+
+
+"""
+------------------------------------------------------------------------------
+Loading
+------------------------------------------------------------------------------
+"""
+
+@st.cache_data(show_spinner=False)
+def load_district_geometry(district, geometry_dir=GEOMETRY_DIR):
+    """
+    Loads the precomputed geometry file of a district (e.g. 'Mitte') and returns
+    a dict with 'bbox' [min_lon, min_lat, max_lon, max_lat] and 'levels' (GeoJSON per level).
+    """
+    with open(os.path.join(geometry_dir, f"{district}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def fit_view(bbox, width=800, height=500, padding=0.1):
+    """
+    Returns latitude, longitude and zoom of a web mercator map view that shows the bounding box.
+
+    Args:
+    - bbox: [min_lon, min_lat, max_lon, max_lat]
+    - width, height: approximate map size in pixels
+    - padding: share of the map kept free around the bounding box
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+
+    def mercator_y(lat):
+        return math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+
+    # Map width at zoom 0 is 512 px in deck.gl
+    lon_zoom = math.log2(width * (1 - padding) * 360 / (512 * max(max_lon - min_lon, 1e-9)))
+    lat_zoom = math.log2(height * (1 - padding) * 2 * math.pi / (512 * max(mercator_y(max_lat) - mercator_y(min_lat), 1e-9)))
+
+    return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2, min(lon_zoom, lat_zoom)
+
+
+def level_for_zoom(zoom):
+    """
+    Returns the most detailed simplification level intended for a map zoom.
+    """
+    return max((level for level, (_, min_zoom) in LEVELS.items() if zoom >= min_zoom),
+               key=lambda level: LEVELS[level][1])
+
+
+if __name__ == "__main__":
+    precompute()
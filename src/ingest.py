@@ -0,0 +1,218 @@
+"""
+------------------------------------------------------------------------------
+Headless ingestion of all districts into memory-mapped Arrow snapshots
+
+Run from the repository root:
+    python -m src.ingest [--districts Mitte Pankow] [--out snapshots] [--workers 4]
+    python -m src.ingest --aggregates-only    (district comparison from the existing snapshots)
+------------------------------------------------------------------------------
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import streamlit as st
+
+from src.aggregates import AGGREGATES_FILE, update_district_aggregates
+from src.cache import get_json
+from src.functions import (CACHE_TTL, DISTRICTS, agenda_frame, iter_pages, members_table, resolve_orga_data,
+                           sync_memberships, system_url)
+from src.resilience import call_with_retries
+from src.store import current_version, fingerprint, open_version, publish
+
+
+# Directory of the district snapshots
+SNAPSHOT_DIR = os.environ.get("BVV_SNAPSHOT_DIR", "snapshots")
+
+# Tables written per district
+TABLES = ["memberships", "organizations", "members", "agenda"]
+
+
+"""
+------------------------------------------------------------------------------
+Ingestion
+------------------------------------------------------------------------------
+"""
+
+def build_district_dataset(district):
+    """
+    Walks system -> body -> person/organization/meeting of a district and returns
+    the normalized tables (as used by the app) and the body's list URLs.
+    Raises IncompleteError if a list could not be fetched completely, so no partial snapshot is written.
+
+    Args: district (str): district name, e.g. 'Mitte'.
+    """
+    systemData = call_with_retries(get_json, system_url(district))
+    bodiesData = call_with_retries(get_json, systemData["body"])
+    body = bodiesData["data"][0]
+
+    # Persons and memberships
+    memberships = sync_memberships(body["person"])
+
+    # Organizations and joined members
+    orgaData = resolve_orga_data(memberships, body.get("organization"))
+    members = members_table(memberships, orgaData)
+
+    # Agenda items of all meetings
+    agenda = agenda_frame(iter_pages(body["meeting"]))
+
+    return {"memberships": memberships, "organizations": orgaData, "members": members, "agenda": agenda,
+            "meta": district_meta(district, body)}
+
+
+def district_meta(district, body):
+    """
+    Returns the meta data of a district snapshot: the body's list URLs and the ingestion time.
+    """
+    return {
+        "district": district,
+        "system": system_url(district),
+        "person": body["person"],
+        "organization": body.get("organization"),
+        "meeting": body["meeting"],
+        "ingested_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def district_dir(district, directory=SNAPSHOT_DIR):
+    """
+    Returns the snapshot directory of a district.
+    """
+    return os.path.join(directory, district.lower())
+
+
+def write_district_snapshot(district, dataset, directory=SNAPSHOT_DIR):
+    """
+    Publishes the tables of a district dataset as new snapshot version (Arrow IPC files, see store.publish).
+    Apps and workers pick it up on their next rerun, sessions still using the previous version keep it.
+    If the tables did not change since the current version (same fingerprint), nothing is written.
+    Returns the new or the unchanged current version.
+    """
+    path = district_dir(district, directory)
+    os.makedirs(path, exist_ok=True)
+    tables = {table: dataset[table] for table in TABLES}
+    digest = fingerprint(tables)
+
+    version = current_version(path)
+    if version is not None and open_version(path, version, [])["meta"].get("fingerprint") == digest:
+        print(f"Snapshot of {district} unchanged")
+        return version
+    return publish(path, tables, {**dataset["meta"], "fingerprint": digest})
+
+
+def ingest(districts=DISTRICTS, directory=SNAPSHOT_DIR, max_workers=4, aggregates_file=AGGREGATES_FILE):
+    """
+    Ingests the districts in parallel, writes one snapshot per district and updates
+    the district's aggregates for the comparison. Returns the list of districts that failed.
+    """
+    failed = []
+
+    def run(district):
+        start = time.perf_counter()
+        dataset = build_district_dataset(district)
+        write_district_snapshot(district, dataset, directory)
+        update_district_aggregates(district, dataset["members"], dataset["organizations"], dataset["agenda"],
+                                   aggregates_file)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run, district): district for district in districts}
+        for future in as_completed(futures):
+            district = futures[future]
+            try:
+                print(f"{district}: done in {future.result():.1f}s")
+            except Exception as e:
+                print(f"{district}: failed ({e})")
+                failed.append(district)
+
+    return failed
+
+
+"""
+------------------------------------------------------------------------------
+Loading snapshots
+------------------------------------------------------------------------------
+"""
+
+def snapshot_version(district, directory=SNAPSHOT_DIR):
+    """
+    Returns the current version of a district snapshot, or None if there is none.
+    Used as cache key so that a new snapshot is picked up immediately.
+    """
+    return current_version(district_dir(district, directory))
+
+
+@st.cache_resource(show_spinner=True, ttl=CACHE_TTL)
+def open_district_snapshot(district, version, directory=SNAPSHOT_DIR):
+    """
+    Opens the snapshot of a district and returns its tables and meta data, or None if there is no snapshot.
+    The tables are memory-mapped and shared by all sessions (and, via the page cache, all processes):
+    they must not be modified in place. Errors are raised, so they are not cached (see load_district_snapshot).
+
+    Args:
+    - district: district name
+    - version: snapshot version (see snapshot_version), part of the cache key.
+    - directory: snapshot directory
+    """
+    if version is None:
+        return None
+    return open_version(district_dir(district, directory), version, TABLES)
+
+
+def load_district_snapshot(district, version, directory=SNAPSHOT_DIR):
+    """
+    Returns the opened snapshot of a district (see open_district_snapshot), or None if there is none
+    or it cannot be read. A failed read is retried on the next call.
+    """
+    try:
+        return open_district_snapshot(district, version, directory)
+    except Exception as e:
+        print(f"Failed to load snapshot of {district}: {e}")
+        return None
+
+
+def update_aggregates_from_snapshots(districts=DISTRICTS, directory=SNAPSHOT_DIR, aggregates_file=AGGREGATES_FILE):
+    """
+    Updates the aggregates of the districts from their existing snapshots, without calling the API.
+    Returns the list of districts without a snapshot.
+    """
+    missing = []
+    for district in districts:
+        dataset = load_district_snapshot(district, snapshot_version(district, directory), directory)
+        if dataset is None:
+            print(f"{district}: no snapshot")
+            missing.append(district)
+            continue
+        update_district_aggregates(district, dataset["members"], dataset["organizations"], dataset["agenda"],
+                                   aggregates_file)
+    return missing
+
+
+"""
+------------------------------------------------------------------------------
+Command line
+------------------------------------------------------------------------------
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest the OParl data of the Berlin districts into Arrow snapshots.")
+    parser.add_argument("--districts", nargs="+", default=DISTRICTS, help="districts to ingest (default: all)")
+    parser.add_argument("--out", default=SNAPSHOT_DIR, help="snapshot directory")
+    parser.add_argument("--workers", type=int, default=4, help="districts ingested at the same time")
+    parser.add_argument("--aggregates", default=AGGREGATES_FILE, help="aggregates file of the district comparison")
+    parser.add_argument("--aggregates-only", action="store_true",
+                        help="only update the aggregates from the existing snapshots")
+    args = parser.parse_args()
+
+    if args.aggregates_only:
+        failed = update_aggregates_from_snapshots(args.districts, args.out, args.aggregates)
+    else:
+        failed = ingest(args.districts, args.out, args.workers, args.aggregates)
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
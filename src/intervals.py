@@ -0,0 +1,237 @@
+"""
+------------------------------------------------------------------------------
+Libraries
+------------------------------------------------------------------------------
+"""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+
+"""
+------------------------------------------------------------------------------
+Interval tree
+------------------------------------------------------------------------------
+"""
+
+# Day numbers used for unknown start and end dates
+MIN_DAY = np.iinfo(np.int64).min // 2
+MAX_DAY = np.iinfo(np.int64).max // 2
+
+# Subtrees up to this level are scanned linearly
+SCAN_LEVEL = 3
+
+
+def to_days(dates):
+    """
+    Converts dates (scalar or array-like) to integer day numbers, NaT to None/MIN_DAY.
+    """
+    if np.ndim(dates) == 0:
+        if pd.isna(dates):
+            return None
+        return int(np.datetime64(pd.Timestamp(dates).date(), "D").astype(np.int64))
+    days = pd.to_datetime(pd.Series(dates), errors="coerce").to_numpy(dtype="datetime64[D]")
+    return np.where(np.isnat(days), MIN_DAY, days.astype(np.int64))
+
+
+class IntervalTree:
+    """
+    Static interval tree over half-open integer intervals [start, end), stored implicitly
+    in arrays sorted by start (as in cgranges): node i sits at the level given by its number
+    of trailing one bits, and max_ends holds the largest end within its subtree.
+    Overlap queries take O(log n + k) for k results.
+
+    Args:
+    - starts, ends: interval bounds (int64 arrays)
+    - ids: value returned for each interval (e.g. row positions)
+    """
+
+    def __init__(self, starts, ends, ids):
+        order = np.lexsort((ends, starts))
+        self.starts = np.asarray(starts, dtype=np.int64)[order]
+        self.ends = np.asarray(ends, dtype=np.int64)[order]
+        self.ids = np.asarray(ids)[order]
+        self.size = len(self.starts)
+        self.max_ends, self.max_level = self._index()
+
+    def _index(self):
+        n = self.size
+        max_ends = self.ends.copy()
+        if n == 0:
+            return max_ends, -1
+
+        # Leaves (even positions) cover themselves, 'last' tracks the max end of the rightmost subtree
+        last_i = (n - 1) & ~1
+        last = max_ends[last_i]
+        k = 1
+        while (1 << k) <= n:
+            x = 1 << (k - 1)
+            nodes = np.arange((x << 1) - 1, n, x << 2)
+            if len(nodes):
+                left = max_ends[nodes - x]
+                right_pos = nodes + x
+                right = np.where(right_pos < n, max_ends[np.minimum(right_pos, n - 1)], last)
+                max_ends[nodes] = np.maximum(self.ends[nodes], np.maximum(left, right))
+            last_i = last_i - x if (last_i >> k) & 1 else last_i + x
+            if last_i < n and max_ends[last_i] > last:
+                last = max_ends[last_i]
+            k += 1
+        return max_ends, k - 1
+
+    def overlap(self, start, end):
+        """
+        Returns the ids of the intervals overlapping [start, end).
+        """
+        n = self.size
+        starts, ends, max_ends = self.starts, self.ends, self.max_ends
+        found = []
+        if n == 0:
+            return self.ids[found]
+
+        stack = [(self.max_level, (1 << self.max_level) - 1, False)]
+        while stack:
+            k, x, left_done = stack.pop()
+            if k <= SCAN_LEVEL:
+                # Small subtree: linear scan over its positions
+                i0 = (x >> k) << k
+                for i in range(i0, min(i0 + (1 << (k + 1)) - 1, n)):
+                    if starts[i] >= end:
+                        break
+                    if start < ends[i]:
+                        found.append(i)
+            elif not left_done:
+                # Visit the left child first, then come back to this node
+                y = x - (1 << (k - 1))
+                stack.append((k, x, True))
+                if y >= n or max_ends[y] > start:
+                    stack.append((k - 1, y, False))
+            elif x < n and starts[x] < end:
+                if start < ends[x]:
+                    found.append(x)
+                stack.append((k - 1, x + (1 << (k - 1)), False))
+        return self.ids[found]
+
+
+"""
+------------------------------------------------------------------------------
+Membership intervals
+------------------------------------------------------------------------------
+"""
+
+class MembershipIntervals:
+    """
+    Interval index over memberships (one row each, with startDate and endDate).
+    A membership is active from its startDate up to and including its endDate; unknown
+    start dates count as 'since ever', unknown end dates as 'still active'.
+    Memberships ending before they start are left out.
+
+    Queries return row positions of the data frame the index was built from:
+    - active_at(date): active on a day, O(log n + k)
+    - overlapping(since, until): active on any day of a date range, O(log n + k)
+    - composition_at(date, by): active members counted by a column
+    - count_active(boundaries, until), churn(boundaries): counts per period, O(log n) per period
+
+    Args:
+    - members: data frame with startDate and endDate columns (see members_table),
+      organization queries use the orga_key column (or organization, if missing).
+    """
+
+    def __init__(self, members: pd.DataFrame):
+        self.members = members
+        starts = to_days(members["startDate"])
+        ends = to_days(members["endDate"])
+        ends = np.where(ends == MIN_DAY, MAX_DAY, ends + 1)  # exclusive end
+        valid = ends > starts
+
+        self.positions = np.flatnonzero(valid)
+        self.starts = starts[valid]
+        self.ends = ends[valid]
+        self.tree = IntervalTree(self.starts, self.ends, self.positions)
+
+        orga_column = "orga_key" if "orga_key" in members else "organization"
+        self.orgas = members[orga_column].to_numpy()[valid] if orga_column in members else None
+        self._orga_trees = {}
+        self._sorted = {}
+
+    def _tree(self, organization=None):
+        if organization is None:
+            return self.tree
+        if organization not in self._orga_trees:
+            mask = self.orgas == organization
+            self._orga_trees[organization] = IntervalTree(self.starts[mask], self.ends[mask], self.positions[mask])
+        return self._orga_trees[organization]
+
+    def active_at(self, date, organization=None):
+        """
+        Returns the sorted row positions of the memberships active on the given day.
+
+        Args:
+        - date: day (str, Timestamp or date)
+        - organization: only memberships of this organization (orga_key), default all
+        """
+        day = to_days(date)
+        return np.sort(self._tree(organization).overlap(day, day + 1))
+
+    def overlapping(self, since, until, organization=None):
+        """
+        Returns the sorted row positions of the memberships active on any day from since to until (inclusive).
+        """
+        return np.sort(self._tree(organization).overlap(to_days(since), to_days(until) + 1))
+
+    def composition_at(self, date, by, organization=None):
+        """
+        Counts the memberships active on the given day by the values of a column (e.g. 'formOfAddress', 'orgaName').
+        """
+        return self.members[by].iloc[self.active_at(date, organization)].value_counts()
+
+    def _sorted_bounds(self, groups):
+        """
+        Returns {group: (sorted starts, sorted ends)}, groups is None or an array aligned with the data frame rows.
+        """
+        if groups is None:
+            return {None: (np.sort(self.starts), np.sort(self.ends))}
+        groups = np.asarray(groups)[self.positions]
+        return {group: (np.sort(self.starts[groups == group]), np.sort(self.ends[groups == group]))
+                for group in pd.unique(groups[pd.notna(groups)])}
+
+    def count_active(self, boundaries, groups=None, until=None):
+        """
+        Counts the memberships active at any time in each period. Period p starts at boundaries[p]
+        and ends before boundaries[p + 1], the last one ends after until (or is open-ended).
+        Returns an array of counts, or a dict of arrays by group if groups is given.
+
+        Args:
+        - boundaries: sorted period start dates
+        - groups: optional array (aligned with the data frame rows) to count separately, e.g. genders
+        - until: last day of the last period, memberships starting later are not counted
+        """
+        period_starts = to_days(boundaries)
+        period_ends = np.append(period_starts[1:], MAX_DAY if until is None else to_days(until) + 1)
+        counts = {}
+        for group, (starts, ends) in self._sorted_bounds(groups).items():
+            # Started before the end of the period minus ended before its start
+            counts[group] = (np.searchsorted(starts, period_ends, side="left")
+                             - np.searchsorted(ends, period_starts, side="right"))
+        return counts[None] if groups is None else counts
+
+    def churn(self, boundaries):
+        """
+        Returns a data frame with the number of memberships starting (joined) and ending (left) in each period.
+        """
+        period_starts = to_days(boundaries)
+        edges = np.append(period_starts, MAX_DAY)
+        starts, ends = self._sorted_bounds(None)[None]
+        ended = ends[ends < MAX_DAY] - 1  # last active day
+        return pd.DataFrame({
+            "joined": np.diff(np.searchsorted(starts, edges, side="left")),
+            "left": np.diff(np.searchsorted(ended, edges, side="left")),
+        })
+
+
+@st.cache_resource(show_spinner=False)
+def build_membership_intervals(members: pd.DataFrame):
+    """
+    Builds the membership interval index once per dataset.
+    """
+    return MembershipIntervals(members)
@@ -0,0 +1,252 @@
+"""
+------------------------------------------------------------------------------
+Libraries
+------------------------------------------------------------------------------
+"""
+
+import json
+import os
+import re
+import threading
+import itertools
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+"""
+------------------------------------------------------------------------------
+Settings
+------------------------------------------------------------------------------
+"""
+
+# JSON lines file of all events (one line per request/section), empty to disable
+METRICS_LOG = os.environ.get("BVV_METRICS_LOG", "")
+
+# Port of the Prometheus metrics endpoint (http://localhost:<port>/metrics), 0 to disable
+METRICS_PORT = int(os.environ.get("BVV_METRICS_PORT", 0))
+
+# Interface the metrics endpoint listens on, e.g. 0.0.0.0 to let a Prometheus server on another host scrape it
+METRICS_HOST = os.environ.get("BVV_METRICS_HOST", "127.0.0.1")
+
+# Show the debug panel (waterfall of the current rerun), also via the URL parameter ?debug=1
+DEBUG_PANEL = os.environ.get("BVV_DEBUG", "").lower() in ("1", "true", "yes")
+
+# Number of recent events kept in memory for the debug panel
+MAX_EVENTS = 5000
+
+# Upper bounds (in seconds) of the latency histogram buckets
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+"""
+------------------------------------------------------------------------------
+Recording
+------------------------------------------------------------------------------
+"""
+
+_lock = threading.Lock()
+_events = deque(maxlen=MAX_EVENTS)
+_counters = defaultdict(float)     # (name, labels) -> value
+_histograms = {}                   # (name, labels) -> [bucket counts, sum, count]
+_log_file = None
+
+# Rerun of the app the events of this thread belong to (see start_rerun), None for the warm-up and the ingester
+_rerun = ContextVar("metrics_rerun", default=None)
+_rerun_ids = itertools.count(1)
+
+# Numeric path segments, e.g. /oparl/person/123
+ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def url_template(url):
+    """
+    Returns the URL without ids and query values, so requests of the same kind share one label,
+    e.g. 'https://host/oparl/person?body&page' for 'https://host/oparl/person?body=1&page=3'.
+    """
+    parts = urlsplit(url)
+    template = f"{parts.netloc}{ID_SEGMENT.sub('/{id}', parts.path)}"
+    keys = [key for key, _ in parse_qsl(parts.query, keep_blank_values=True)]
+    return f"{template}?{'&'.join(keys)}" if keys else template
+
+
+def _observe(name, labels, value):
+    histogram = _histograms.setdefault((name, labels), [[0] * len(BUCKETS), 0.0, 0])
+    for i, bound in enumerate(BUCKETS):
+        if value <= bound:
+            histogram[0][i] += 1
+    histogram[1] += value
+    histogram[2] += 1
+
+
+def start_rerun():
+    """
+    Starts a new rerun of the app in the current thread (the session's script thread) and returns its id.
+    The events recorded in this thread, and in executors created with inherit_context, are tagged with it.
+    """
+    rerun = next(_rerun_ids)
+    _rerun.set(rerun)
+    return rerun
+
+
+def _emit(event):
+    global _log_file
+    event["rerun"] = _rerun.get()
+    _events.append(event)
+    if METRICS_LOG:
+        if _log_file is None:
+            _log_file = open(METRICS_LOG, "a", encoding="utf-8")
+        _log_file.write(json.dumps(event) + "\n")
+        _log_file.flush()
+
+
+def record_request(url, status, size, latency, cache, started=None):
+    """
+    Records one fetch.
+
+    Args:
+    - url: request URL
+    - status: HTTP status code, or 'error' if no response was received or its body could not be read
+    - size: response size in bytes
+    - latency: seconds until the response and its body were received
+    - cache: 'hit' (served from the disk cache) or 'miss' (sent to the server)
+    - started: start time (time.time()), defaults to now minus latency
+    """
+    template = url_template(url)
+    labels = (("template", template), ("status", str(status)), ("cache", cache))
+    with _lock:
+        _counters[("bvv_http_requests_total", labels)] += 1
+        _counters[("bvv_http_response_bytes_total", (("template", template),))] += size or 0
+        _observe("bvv_http_request_seconds", (("template", template), ("cache", cache)), latency)
+        _emit({
+            "kind": "request",
+            "name": template,
+            "url": url,
+            "status": status,
+            "bytes": size,
+            "cache": cache,
+            "start": started if started is not None else time.time() - latency,
+            "duration": latency,
+            "thread": threading.current_thread().name,
+        })
+
+
+def record_retry(url, attempt, error):
+    """
+    Records a failed attempt of a fetch that is retried.
+    """
+    template = url_template(url)
+    with _lock:
+        _counters[("bvv_http_retries_total", (("template", template),))] += 1
+        _emit({
+            "kind": "retry",
+            "name": template,
+            "url": url,
+            "attempt": attempt,
+            "error": str(error),
+            "start": time.time(),
+            "duration": 0.0,
+            "thread": threading.current_thread().name,
+        })
+
+
+@contextmanager
+def section(name):
+    """
+    Times a block of the app (data loading step or rendered section).
+
+    Example: with section("map"): render_map(selected_district)
+    """
+    started = time.time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        with _lock:
+            _observe("bvv_section_seconds", (("section", name),), duration)
+            _emit({
+                "kind": "section",
+                "name": name,
+                "start": started,
+                "duration": duration,
+                "thread": threading.current_thread().name,
+            })
+
+
+def rerun_events(rerun):
+    """
+    Returns the recorded events of a rerun (see start_rerun). Requests of other sessions and
+    of the warm-up are not included.
+    """
+    with _lock:
+        return [event for event in _events if event["rerun"] == rerun]
+
+
+"""
+------------------------------------------------------------------------------
+Prometheus endpoint
+------------------------------------------------------------------------------
+"""
+
+def _format_labels(labels):
+    return ",".join(f'{key}="{value}"' for key, value in labels)
+
+
+def prometheus_text():
+    """
+    Returns all counters and histograms in the Prometheus text exposition format.
+    """
+    lines = []
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            lines.append(f"{name}{{{_format_labels(labels)}}} {value:g}")
+        for (name, labels), (buckets, total, count) in sorted(_histograms.items()):
+            label_text = _format_labels(labels)
+            for bound, bucket_count in zip(BUCKETS, buckets):
+                lines.append(f'{name}_bucket{{{label_text},le="{bound:g}"}} {bucket_count}')
+            lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f"{name}_sum{{{label_text}}} {total:g}")
+            lines.append(f"{name}_count{{{label_text}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """
+    Serves prometheus_text() at http://<host>:<port>/metrics in a background thread.
+    Does nothing if the port is 0 or the server is already running.
+    """
+    global _metrics_server
+    if not port:
+        return
+    with _lock:
+        if _metrics_server is not None:
+            return
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                payload = prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            _metrics_server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            print(f"Metrics endpoint on {host}:{port} not started: {e}")
+            return
+        threading.Thread(target=_metrics_server.serve_forever, name="metrics", daemon=True).start()
@@ -0,0 +1,219 @@
+"""
+------------------------------------------------------------------------------
+Libraries
+------------------------------------------------------------------------------
+"""
+
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import requests
+
+from src.metrics import record_retry
+from src.scheduler import INTERACTIVE, MAX_INTERACTIVE_WAIT, ThrottledError, current_priority
+
+
+"""
+------------------------------------------------------------------------------
+Settings
+------------------------------------------------------------------------------
+"""
+
+# Upper bound (in seconds) of a single backoff delay and of an honoured Retry-After header
+MAX_BACKOFF = 30
+MAX_RETRY_AFTER = 60
+
+# Responses worth retrying: throttling and server errors
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Consecutive failures after which requests to a host fail fast, override via environment
+FAILURE_THRESHOLD = int(os.environ.get("BVV_BREAKER_THRESHOLD", 5))
+
+# Seconds until a single trial request is let through to an open host again
+RESET_TIMEOUT = float(os.environ.get("BVV_BREAKER_RESET", 60))
+
+
+"""
+------------------------------------------------------------------------------
+Errors
+------------------------------------------------------------------------------
+"""
+
+class CircuitOpenError(requests.ConnectionError):
+    """
+    Raised instead of sending a request to a host whose circuit breaker is open.
+    """
+
+
+class IncompleteError(Exception):
+    """
+    Raised when data could only be fetched partially (e.g. a page of a list failed).
+    partial holds the data fetched so far, in the type the raising function returns.
+
+    Args:
+    - url: URL of the list or resource
+    - failed_urls: URLs that could not be fetched
+    - partial: data fetched so far
+    """
+
+    def __init__(self, url, failed_urls, partial=None):
+        super().__init__(f"{len(failed_urls)} request(s) for {url} failed, first: {failed_urls[0] if failed_urls else url}")
+        self.url = url
+        self.failed_urls = list(failed_urls)
+        self.partial = partial
+
+    def with_partial(self, partial):
+        """
+        Returns the error with partial replaced, e.g. converted to a data frame.
+        """
+        self.partial = partial
+        return self
+
+
+"""
+------------------------------------------------------------------------------
+Circuit breaker
+------------------------------------------------------------------------------
+"""
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker. After FAILURE_THRESHOLD consecutive failures the circuit opens
+    and requests fail fast with CircuitOpenError. After RESET_TIMEOUT seconds one trial request
+    is let through (half open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, host, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Raises CircuitOpenError if no request to the host may be sent right now.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half-open"  # this caller sends the trial request
+                return
+            raise CircuitOpenError(f"Circuit open for {self.host} ({self.failures} consecutive failures)")
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"Circuit opened for {self.host} after {self.failures} consecutive failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(url):
+    """
+    Returns the circuit breaker of the URL's host.
+    """
+    host = urlsplit(url).netloc
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+"""
+------------------------------------------------------------------------------
+Retries
+------------------------------------------------------------------------------
+"""
+
+def is_retryable(error):
+    """
+    Returns True for errors that may go away on retry: connection errors, timeouts,
+    broken downloads and responses with a status in RETRY_STATUS.
+    """
+    if isinstance(error, (CircuitOpenError, ThrottledError)):
+        return False
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUS
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError))
+
+
+def retry_after(response):
+    """
+    Returns the delay (in seconds) requested by the Retry-After header of the response, or None.
+    """
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+def backoff_delay(attempt, delay, response=None):
+    """
+    Returns the delay before the next attempt: the server's Retry-After if given,
+    otherwise exponential backoff with full jitter (random between 0 and delay * 2**attempt).
+
+    Args:
+    - attempt: number of the failed attempt, starting at 0
+    - delay: base delay in seconds
+    - response: response of the failed attempt, if any
+    """
+    requested = retry_after(response)
+    if requested is not None:
+        return requested
+    return random.uniform(0, min(MAX_BACKOFF, delay * 2 ** attempt))
+
+
+def call_with_retries(func, url, retries=3, delay=1, **kwargs):
+    """
+    Calls func(url, **kwargs) up to retries times while it fails with a retryable error
+    (see is_retryable), waiting backoff_delay between the attempts.
+    Other errors and the error of the last attempt are raised, as is the error of an interactive
+    request whose server asks to wait (Retry-After) longer than MAX_INTERACTIVE_WAIT.
+
+    Args:
+    - func: function fetching the URL, e.g. get_json
+    - url: request URL
+    - retries: Max. number of attempts.
+    - delay: Base delay (in seconds) of the exponential backoff.
+    """
+    for attempt in range(retries):
+        try:
+            return func(url, **kwargs)
+        except requests.RequestException as e:
+            if attempt == retries - 1 or not is_retryable(e):
+                raise
+            response = getattr(e, "response", None)
+            if current_priority() == INTERACTIVE and (retry_after(response) or 0) > MAX_INTERACTIVE_WAIT:
+                print(f"Giving up on URL {url}: server asks to retry in {retry_after(response):.0f}s")
+                raise
+            wait = backoff_delay(attempt, delay, response)
+            print(f"Attempt {attempt + 1} failed for URL {url}: {e}, retrying in {wait:.1f}s")
+            record_retry(url, attempt + 1, e)
+            time.sleep(wait)
@@ -0,0 +1,268 @@
+"""
+------------------------------------------------------------------------------
+Libraries
+------------------------------------------------------------------------------
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from urllib.parse import urlsplit
+
+import requests
+
+
+"""
+------------------------------------------------------------------------------
+Settings
+------------------------------------------------------------------------------
+"""
+
+# Requests per second and burst size per district server, override via environment
+RATE_PER_HOST = float(os.environ.get("BVV_RATE_PER_HOST", 10))
+BURST = int(os.environ.get("BVV_BURST", 20))
+
+# Lower bound of the per-host rate after the server asked to slow down (429)
+MIN_RATE = 0.5
+
+# Max. number of simultaneous requests per host and over all hosts
+MAX_PER_HOST = int(os.environ.get("BVV_MAX_PER_HOST", 8))
+MAX_CONCURRENT = int(os.environ.get("BVV_MAX_CONCURRENT", 32))
+
+# Share of MAX_CONCURRENT that background requests may use, the rest is kept for users
+BACKGROUND_SHARE = 0.5
+
+# Priority classes, lower values are processed first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Longest pause (in seconds, e.g. from Retry-After) interactive requests wait for, they fail fast beyond it
+MAX_INTERACTIVE_WAIT = 5
+
+
+"""
+------------------------------------------------------------------------------
+Errors
+------------------------------------------------------------------------------
+"""
+
+class ThrottledError(requests.ConnectionError):
+    """
+    Raised instead of waiting for an interactive request to a host the server paused
+    for longer than MAX_INTERACTIVE_WAIT.
+    """
+
+
+"""
+------------------------------------------------------------------------------
+Request priority
+------------------------------------------------------------------------------
+"""
+
+_priority = ContextVar("request_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority):
+    """
+    Sends all requests of the block with the given priority class.
+
+    Example: with request_priority(BACKGROUND): warm_district(district)
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    """
+    Returns the priority class requests of the current thread are sent with.
+    """
+    return _priority.get()
+
+
+def inherit_context():
+    """
+    Returns an initializer for a ThreadPoolExecutor, so its worker threads send their requests
+    with the priority class of the thread creating the executor. The thread's other context
+    variables are passed on as well (e.g. the rerun of the metrics, see src/metrics.py).
+
+    Example: ThreadPoolExecutor(max_workers=4, initializer=inherit_context())
+    """
+    context = copy_context()
+
+    def initializer():
+        for variable, value in context.items():
+            variable.set(value)
+    return initializer
+
+
+"""
+------------------------------------------------------------------------------
+Scheduler
+------------------------------------------------------------------------------
+"""
+
+class TokenBucket:
+    """
+    Request budget of one host: refills at rate tokens per second up to burst tokens.
+    The rate is halved when the server answers 429 and recovers slowly with successful requests.
+    """
+
+    def __init__(self, rate=RATE_PER_HOST, burst=BURST):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.running = 0
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """
+        Seconds until a token is available (0 if one is available now).
+        """
+        self.refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class RequestScheduler:
+    """
+    Decides when a request may be sent. Every request needs a token of its host's
+    bucket (RATE_PER_HOST, BURST), a free host slot (MAX_PER_HOST) and a free slot of
+    the global budget (MAX_CONCURRENT), of which background requests may only use BACKGROUND_SHARE.
+    Waiting requests are served by priority class, then in arrival order.
+    """
+
+    def __init__(self, rate=RATE_PER_HOST, burst=BURST, max_per_host=MAX_PER_HOST, max_concurrent=MAX_CONCURRENT,
+                 background_share=BACKGROUND_SHARE):
+        self.rate = rate
+        self.burst = burst
+        self.max_per_host = max_per_host
+        self.max_concurrent = max_concurrent
+        self.max_background = max(1, int(max_concurrent * background_share))
+        self.running = 0
+        self.buckets = {}
+        self._waiting = []  # heap of (priority, ticket, host)
+        self._tickets = itertools.count()
+        self._condition = threading.Condition()
+
+    def _bucket(self, host):
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.burst)
+        return self.buckets[host]
+
+    def _wait_time(self, priority, host, now):
+        """
+        Seconds until the request could be sent, None if it waits for a running request to finish.
+        """
+        limit = self.max_concurrent if priority == INTERACTIVE else self.max_background
+        bucket = self._bucket(host)
+        if self.running >= limit or bucket.running >= self.max_per_host:
+            return None
+        return bucket.wait_time(now)
+
+    @contextmanager
+    def slot(self, url, priority=None):
+        """
+        Blocks until the request to the URL may be sent and holds its slot during the block.
+        Raises ThrottledError for interactive requests to a host paused for longer than MAX_INTERACTIVE_WAIT.
+
+        Args:
+        - url: request URL
+        - priority: priority class, defaults to the one set with request_priority.
+        """
+        host = urlsplit(url).netloc
+        if priority is None:
+            priority = _priority.get()
+
+        with self._condition:
+            entry = (priority, next(self._tickets), host)
+            heapq.heappush(self._waiting, entry)
+            while True:
+                now = time.monotonic()
+                # Users do not wait for a long server-requested pause
+                paused = self._bucket(host).paused_until - now
+                if priority == INTERACTIVE and paused > MAX_INTERACTIVE_WAIT:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._condition.notify_all()
+                    raise ThrottledError(f"Requests to {host} are paused for {paused:.0f}s by the server")
+                timeout = None
+                ready = False
+                # The first waiter (by priority and arrival) that can be sent goes first
+                for waiting in sorted(self._waiting):
+                    wait = self._wait_time(waiting[0], waiting[2], now)
+                    if wait == 0:
+                        ready = waiting == entry
+                        break
+                    if wait is not None:
+                        timeout = wait if timeout is None else min(timeout, wait)
+                if ready:
+                    break
+                self._condition.wait(timeout)
+
+            self._waiting.remove(entry)
+            heapq.heapify(self._waiting)
+            bucket = self._bucket(host)
+            bucket.tokens -= 1
+            bucket.running += 1
+            self.running += 1
+            self._condition.notify_all()
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                bucket.running -= 1
+                self.running -= 1
+                self._condition.notify_all()
+
+    def slow_down(self, url, seconds=None):
+        """
+        Halves the request rate of the URL's host (down to MIN_RATE) and pauses it for the given seconds,
+        e.g. after a 429 response with Retry-After.
+        """
+        with self._condition:
+            bucket = self._bucket(urlsplit(url).netloc)
+            bucket.rate = max(MIN_RATE, bucket.rate / 2)
+            if seconds:
+                bucket.paused_until = max(bucket.paused_until, time.monotonic() + seconds)
+            print(f"Slowing down requests to {urlsplit(url).netloc}: {bucket.rate:g}/s")
+
+    def speed_up(self, url):
+        """
+        Lets the rate of the URL's host recover by 5% after a successful request.
+        """
+        with self._condition:
+            bucket = self._bucket(urlsplit(url).netloc)
+            if bucket.rate < bucket.max_rate:
+                bucket.rate = min(bucket.max_rate, bucket.rate * 1.05)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    Returns the process-wide request scheduler, created with the module settings on first use.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = RequestScheduler(RATE_PER_HOST, BURST, MAX_PER_HOST, MAX_CONCURRENT)
+    return _scheduler
@@ -0,0 +1,286 @@
+"""
+------------------------------------------------------------------------------
+Libraries
+------------------------------------------------------------------------------
+"""
+
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from bisect import bisect_left
+
+import pandas as pd
+import streamlit as st
+
+from src.functions import STOPWORDS
+
+
+"""
+------------------------------------------------------------------------------
+Tokenization
+------------------------------------------------------------------------------
+"""
+
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+# German suffixes removed by the stemmer, longest first
+SUFFIXES = ["ungen", "heiten", "keiten", "innen", "ung", "heit", "keit", "erin", "ern", "em", "er", "en", "es", "e", "s", "n"]
+MIN_STEM = 4
+
+# Suffixes starting with 'e' may leave a shorter stem (e.g. 'bauen' -> 'bau', but 'haus' stays 'haus')
+MIN_STEM_E = 3
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def fold(text):
+    """
+    Lowercases a text and replaces umlauts and ß (e.g. 'Straße' -> 'strasse').
+    """
+    return text.lower().translate(UMLAUTS)
+
+
+FOLDED_STOPWORDS = {fold(word) for word in STOPWORDS}
+
+
+def stem(token):
+    """
+    Removes one common German suffix from a folded token (e.g. 'wohnungen' -> 'wohn', 'bauen' -> 'bau').
+    """
+    for suffix in SUFFIXES:
+        min_stem = MIN_STEM_E if suffix.startswith("e") else MIN_STEM
+        if token.endswith(suffix) and len(token) - len(suffix) >= min_stem:
+            return token[:-len(suffix)]
+    return token
+
+
+def trigrams(term):
+    """
+    Returns the set of three-letter substrings of a term.
+    """
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+def tokenize(text, drop_stopwords=False):
+    """
+    Returns the stemmed tokens of a text.
+    """
+    tokens = TOKEN_PATTERN.findall(fold(text))
+    if drop_stopwords:
+        tokens = [token for token in tokens if token not in FOLDED_STOPWORDS]
+    return [stem(token) for token in tokens]
+
+
+"""
+------------------------------------------------------------------------------
+Inverted index
+------------------------------------------------------------------------------
+"""
+
+class AgendaIndex:
+    """
+    Inverted index over agenda item names. Query terms match all indexed terms they are
+    a prefix of (e.g. 'Verkehr' matches 'Verkehrsberuhigung') or, for compound words, contained in
+    (e.g. 'Verkehr' matches 'Straßenverkehr'), multiple terms are combined with AND.
+
+    Args: names (list): agenda item names, documents are referred to by their position.
+    """
+
+    def __init__(self, names):
+        self.size = len(names)
+        postings = {}
+        self.doc_terms = []
+        for doc, name in enumerate(names):
+            tokens = set(tokenize(name or ""))
+            self.doc_terms.append(tokens)
+            for token in tokens:
+                postings.setdefault(token, []).append(doc)
+
+        self.terms = sorted(postings)
+        self.postings = postings
+
+        # Trigrams of the indexed terms, for matches inside compound words
+        self.trigrams = {}
+        for i, term in enumerate(self.terms):
+            for gram in trigrams(term):
+                self.trigrams.setdefault(gram, []).append(i)
+        self.idf = {term: math.log(1 + self.size / len(docs)) for term, docs in postings.items()}
+
+    def prefix_terms(self, prefix):
+        """
+        Returns the indexed terms starting with prefix.
+        """
+        start = bisect_left(self.terms, prefix)
+        end = bisect_left(self.terms, prefix + "\uffff")
+        return self.terms[start:end]
+
+    def matching_terms(self, query_term):
+        """
+        Returns the indexed terms starting with or containing the query term. Terms containing it
+        are looked up by the trigrams of the query term, so only candidate terms are compared.
+        Query terms shorter than three letters only match as prefix.
+        """
+        terms = set(self.prefix_terms(query_term))
+        if len(query_term) >= 3:
+            lists = sorted((self.trigrams.get(gram, []) for gram in trigrams(query_term)), key=len)
+            candidates = set(lists[0]).intersection(*lists[1:])
+            terms.update(self.terms[i] for i in candidates if query_term in self.terms[i])
+        return sorted(terms)
+
+    def weight(self, term, query_term):
+        """
+        Score of an indexed term for a query term: exact matches count twice as much as prefix matches,
+        prefix matches twice as much as matches inside a compound word.
+        """
+        if term == query_term:
+            return self.idf[term]
+        return self.idf[term] * (0.5 if term.startswith(query_term) else 0.25)
+
+    def search(self, query, limit=None):
+        """
+        Returns the positions of the documents matching all query terms, best matches first.
+        Exact term matches score higher than prefix matches, prefix matches higher than matches
+        inside compound words, rare terms higher than common ones.
+
+        Args:
+        - query: search text
+        - limit: max. number of results
+        """
+        query_terms = tokenize(query, drop_stopwords=True)
+        if not query_terms:
+            return []
+
+        # Start with the query term matching the fewest documents
+        matches = {query_term: self.matching_terms(query_term) for query_term in set(query_terms)}
+        ordered = sorted(matches, key=lambda query_term: sum(len(self.postings[term]) for term in matches[query_term]))
+        first, rest = ordered[0], ordered[1:]
+
+        scores = {}
+        for term in matches[first]:
+            weight = self.weight(term, first)
+            for doc in self.postings[term]:
+                if weight > scores.get(doc, 0):
+                    scores[doc] = weight
+
+        # AND: check the remaining terms against the terms of each candidate
+        for query_term in rest:
+            remaining = {}
+            for doc, score in scores.items():
+                best = max((self.weight(term, query_term) for term in self.doc_terms[doc] if query_term in term), default=None)
+                if best is not None:
+                    remaining[doc] = score + best
+            scores = remaining
+            if not scores:
+                return []
+
+        key = lambda doc: (-scores[doc], doc)
+        if limit:
+            return heapq.nsmallest(limit, scores, key=key)
+        return sorted(scores, key=key)
+
+
+@st.cache_resource(show_spinner=False)
+def build_agenda_index(names):
+    """
+    Builds the inverted index of the agenda item names once per dataset.
+
+    Args: names (pd.Series): agenda item names, hashed by Streamlit much faster than a tuple of strings
+    """
+    return AgendaIndex(names.fillna("").tolist())
+
+
+"""
+------------------------------------------------------------------------------
+Term statistics (word cloud)
+------------------------------------------------------------------------------
+"""
+
+# Words start with a letter, may contain digits and hyphens (e.g. 'B-Plan', 'U2-Linie')
+WORD_PATTERN = re.compile(r"[^\W\d_][\w-]*")
+
+
+class TermStats:
+    """
+    Stopword-filtered term counts of the agenda item names of one district.
+    Counts are updated incrementally: the counts of each meeting are kept with a hash of its
+    agenda item names, so calling update with a refreshed agenda data frame only processes the
+    new and changed meetings, and subtracts the old counts of changed and removed ones.
+    version changes whenever the counts change.
+    """
+
+    def __init__(self):
+        self.counts = Counter()   # by folded word
+        self.forms = {}           # spellings per folded word, e.g. {'strasse': Counter({'Straße': 3})}
+        self.meetings = {}        # meeting -> (hash of its agenda item names, Counter of its words)
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def _add(self, words, sign):
+        for word, count in words.items():
+            key = fold(word)
+            self.counts[key] += sign * count
+            forms = self.forms.setdefault(key, Counter())
+            forms[word] += sign * count
+            if forms[word] <= 0:
+                del forms[word]
+            if self.counts[key] <= 0:
+                del self.counts[key]
+                del self.forms[key]
+
+    def update(self, agendaItems):
+        """
+        Counts the agenda items of new meetings and recounts meetings whose agenda items changed.
+        Meetings no longer in the data frame are subtracted. Returns True if the counts changed.
+
+        Args: agendaItems: agenda item data frame with 'meeting' and 'name' columns (see agenda_frame)
+        """
+        with self._lock:
+            meeting_ids = agendaItems["meeting"].astype(object).fillna("")
+            names = agendaItems["name"].astype(object)
+            # Order-independent hash of the names per meeting (sum of the row hashes, wraps around)
+            hashes = pd.Series(pd.util.hash_pandas_object(names, index=False).to_numpy(), index=meeting_ids.to_numpy())
+            signatures = hashes.groupby(level=0).sum()
+
+            changed = {meeting for meeting, signature in signatures.items()
+                       if self.meetings.get(meeting, (None,))[0] != signature}
+            removed = set(self.meetings) - set(signatures.index)
+            if not changed and not removed:
+                return False
+
+            # Old counts of changed and removed meetings
+            for meeting in (changed | removed) & set(self.meetings):
+                self._add(self.meetings.pop(meeting)[1], -1)
+
+            words = {meeting: Counter() for meeting in changed}
+            rows = meeting_ids.isin(changed).to_numpy()
+            for meeting, name in zip(meeting_ids[rows], names[rows]):
+                if not isinstance(name, str):
+                    continue
+                for word in WORD_PATTERN.findall(name):
+                    key = fold(word)
+                    if len(key) < 2 or key in FOLDED_STOPWORDS:
+                        continue
+                    words[meeting][word] += 1
+
+            for meeting in changed:
+                self.meetings[meeting] = (signatures[meeting], words[meeting])
+                self._add(words[meeting], 1)
+            self.version += 1
+            return True
+
+    def frequencies(self, limit=100):
+        """
+        Returns the most frequent terms in their most common spelling with their counts.
+        """
+        with self._lock:
+            return {self.forms[key].most_common(1)[0][0]: count for key, count in self.counts.most_common(limit)}
+
+
+@st.cache_resource(show_spinner=False)
+def get_term_stats(district):
+    """
+    Returns the term statistics of a district, kept across reruns and sessions.
+    """
+    return TermStats()
@@ -0,0 +1,125 @@
+"""
+------------------------------------------------------------------------------
+Meetings, agenda items, word cloud and search
+------------------------------------------------------------------------------
+"""
+
+from io import BytesIO
+
+import pandas as pd
+import streamlit as st
+
+from src.functions import fetch_meeting_locations
+from src.metrics import section
+from src.search import build_agenda_index, get_term_stats
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def word_cloud_png(district, version, _frequencies):
+    """
+    Renders the word cloud of the term frequencies as PNG, once per district and term statistics version.
+    """
+    from wordcloud import WordCloud
+
+    # Create word cloud from the stopword-filtered term counts
+    wordcloud = WordCloud(
+        width=800,  
+        height=400,  
+        background_color="white",  
+        colormap="Greys",  
+        max_words=100,  
+        contour_color="black",  
+        contour_width=1
+    ).generate_from_frequencies(_frequencies)
+
+    png = BytesIO()
+    wordcloud.to_image().save(png, format="PNG")
+    return png.getvalue()
+
+
+def render_word_cloud(agendaItems, selected_district):
+    """
+    Shows a word cloud of the agenda item names.
+    """
+    # Term counts, only new meetings are counted
+    term_stats = get_term_stats(selected_district)
+    term_stats.update(agendaItems)
+
+    frequencies = term_stats.frequencies(100)
+    if frequencies:
+        st.image(word_cloud_png(selected_district, term_stats.version, frequencies), use_container_width=True)
+
+
+def render_search(agendaItems, word_to_search):
+    """
+    Shows the agenda items matching the search word with their meetings.
+
+    Args:
+    - agendaItems: agenda item data frame (see agenda_frame)
+    - word_to_search: search text
+    """
+    # Agenda items in the order of the index
+    agenda_index = build_agenda_index(agendaItems["name"])
+
+    # Ranked matches from the inverted index
+    matches = agendaItems.iloc[agenda_index.search(word_to_search)]
+
+    # Locations missing in the meeting list, fetched once per meeting
+    missing_locations = tuple(matches.loc[matches["location"].isna(), "meeting"].astype(str).unique())
+    fetched_locations = fetch_meeting_locations(missing_locations)
+
+    location_description = matches["location"].astype(object).fillna(
+        matches["meeting"].astype(object).map(fetched_locations)).fillna("unbekannt")
+
+    matching_items = pd.DataFrame({
+        "Name der Sitzung": matches["meetingName"],
+        "Startzeitpunkt": matches["start"],
+        "Endzeitpunkt": matches["end"],
+        "Ort": location_description,
+        "Tagesordnungspunkt": matches["name"],
+        "Öffentlich?": matches["public"].fillna(False).map({True: "Ja", False: "Nein"})
+    }).reset_index(drop=True)
+
+    # Display the matching results
+    if not matching_items.empty:
+        st.write(f"{len(matching_items)} Treffer für '{word_to_search}' gefunden:")
+        # Show results in data frame
+        st.dataframe(matching_items, use_container_width=True)  
+    else:
+        st.write(f"Keine Treffer für '{word_to_search}' gefunden.")
+
+
+@st.fragment
+def render_agenda(agendaItems, selected_district):
+    """
+    Shows the word cloud (on demand) and the keyword search over the agenda items.
+    Runs as fragment: typing a search word or toggling the word cloud only reruns this section.
+
+    Args:
+    - agendaItems: agenda item data frame (see agenda_frame)
+    - selected_district: district name
+    """
+    st.subheader("Sitzungen und Tagesordnungspunkte")
+
+    # Check if agenda data is empty
+    if agendaItems["name"].dropna().empty:
+        # Show an error message if no agenda items are found
+        st.error(f"Error: No agenda items found for {selected_district}.")
+        return
+
+    col3, col4 = st.columns(2)
+
+    with col3:
+        st.caption("Durchsuche alle Sitzungsdaten und filtere nach einem Tagesordnungspunkt, der dich interessiert:")
+
+        # Word cloud only on demand
+        if st.toggle("Wortwolke anzeigen"):
+            render_word_cloud(agendaItems, selected_district)
+
+        # User input for the search word
+        word_to_search = st.text_input("Bitte ein Suchwort eingeben (z.B. Verkehr, Bildung, Wohnen, Haushalt etc.):", "")
+
+    # Check if a search word is provided
+    if word_to_search:
+        with section("agenda search"):
+            render_search(agendaItems, word_to_search)
@@ -0,0 +1,100 @@
+"""
+------------------------------------------------------------------------------
+Comparison of all districts from the materialized aggregates
+------------------------------------------------------------------------------
+"""
+
+import pandas as pd
+import streamlit as st
+
+from src.aggregates import aggregates_version, load_aggregates
+
+
+def comparison_table(aggregates, year):
+    """
+    Returns one row per district with the key figures of the ranking.
+
+    Args:
+    - aggregates: aggregates of all districts (see load_aggregates)
+    - year: year of the BVV members and the meeting volumes
+    """
+    def metric(name, key=None):
+        rows = aggregates[aggregates["metric"] == name]
+        if key is not None:
+            rows = rows[rows["key"] == str(key)]
+        return rows.groupby("district")["value"].sum()
+
+    table = pd.DataFrame({
+        "Frauen": metric("women", year),
+        "Männer": metric("men", year),
+        "Fraktionsmitglieder": metric("faction_members"),
+        "Ausschüsse": aggregates[aggregates["metric"] == "committee_members"].groupby("district").size(),
+        "⌀ Rollen Frauen": metric("roles_per_person", "w"),
+        "⌀ Rollen Männer": metric("roles_per_person", "m"),
+        f"Sitzungen {year}": metric("meetings", year),
+        f"Tagesordnungspunkte {year}": metric("agenda_items", year),
+    })
+    total = table["Frauen"] + table["Männer"]
+    table.insert(2, "Anteil Frauen %", (table["Frauen"] / total * 100).round(1))
+    return table.rename_axis("Bezirk")
+
+
+@st.fragment
+def render_comparison(selected_district):
+    """
+    Compares all districts with the aggregates written by the ingester and the warm-up.
+    Only reads the aggregates table, no API requests. Runs as fragment.
+
+    Args: selected_district: district highlighted in the charts
+    """
+    import plotly.express as px
+
+    st.subheader("Bezirke im Vergleich")
+    if not st.toggle("Vergleich anzeigen"):
+        return
+
+    aggregates, districts = load_aggregates(aggregates_version())
+    if aggregates.empty:
+        st.info("Noch keine Vergleichsdaten vorhanden. Sie entstehen beim Import (python -m src.ingest) "
+                "oder beim Vorwärmen der Caches (BVV_WARMUP=1).")
+        return
+
+    st.caption(f"Stand der Daten: {', '.join(f'{row.district} ({row.updated_at[:10]})' for row in districts.itertuples())}")
+    highlight = selected_district.lower()
+
+    # Share of women in the BVV per year
+    gender = aggregates[aggregates["metric"].isin(["women", "men"])]
+    gender = gender.pivot_table(index=["district", "key"], columns="metric", values="value")
+    gender = gender.reindex(columns=["women", "men"], fill_value=0).reset_index()
+    gender["Jahr"] = gender["key"].astype(int)
+    gender["Anteil Frauen %"] = (gender["women"] / (gender["women"] + gender["men"]) * 100).round(1)
+    fig = px.line(gender.sort_values("Jahr"), x="Jahr", y="Anteil Frauen %", color="district",
+                  labels={"district": "Bezirk"}, markers=True)
+    fig.update_traces(opacity=0.35)
+    fig.for_each_trace(lambda trace: trace.update(opacity=1, line_width=4) if trace.name.lower() == highlight else None)
+    fig.update_layout(yaxis=dict(ticksuffix="%"))
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Key figures, ranked by a selectable column
+    yearly = aggregates[aggregates["metric"].isin(["women", "men", "meetings", "agenda_items"])]
+    year = st.selectbox("Jahr:", sorted(yearly["key"].astype(int).unique(), reverse=True))
+    table = comparison_table(aggregates, year)
+    ranking = st.selectbox("Rangfolge nach:", list(table.columns), index=2)
+    table = table.sort_values(ranking, ascending=False)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        ranked = table[ranking].reset_index()
+        colors = ranked["Bezirk"].str.lower().eq(highlight).map({True: "#4E8D6F", False: "#8bbf9f"})
+        fig = px.bar(ranked, x=ranking, y="Bezirk", text=ranking)
+        fig.update_traces(marker_color=colors)
+        fig.update_layout(yaxis={"categoryorder": "total ascending"})
+        st.plotly_chart(fig, use_container_width=True)
+    with col2:
+        # Current members per faction
+        factions = aggregates[aggregates["metric"] == "faction_members"]
+        fig = px.bar(factions, x="value", y="district", color="key", orientation="h",
+                     labels={"value": "Mitglieder", "district": "Bezirk", "key": "Fraktion"})
+        st.plotly_chart(fig, use_container_width=True)
+
+    st.dataframe(table, use_container_width=True)
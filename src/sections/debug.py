@@ -0,0 +1,62 @@
+"""
+------------------------------------------------------------------------------
+Debug panel: waterfall of the current rerun
+------------------------------------------------------------------------------
+"""
+
+import pandas as pd
+import streamlit as st
+
+from src.metrics import rerun_events
+
+
+def render_debug_panel(rerun, rerun_started):
+    """
+    Shows the sections and requests of the current rerun as waterfall and table.
+    Requests of cached functions only appear when the cache was empty.
+
+    Args:
+    - rerun: id of the current rerun (see start_rerun)
+    - rerun_started: time.time() at the start of the rerun
+    """
+    import plotly.graph_objects as go
+
+    events = pd.DataFrame(rerun_events(rerun))
+
+    with st.expander("Debug: Ablauf dieses Durchlaufs", expanded=True):
+        if events.empty:
+            st.write("Keine Ereignisse aufgezeichnet.")
+            return
+
+        events["offset"] = events["start"] - rerun_started
+        events = events.sort_values("offset").reset_index(drop=True)
+        requests = events[events["kind"] == "request"]
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Dauer", f"{(events['offset'] + events['duration']).max():.2f} s")
+        col2.metric("Requests", len(requests))
+        col3.metric("Cache-Treffer", int((requests["cache"] == "hit").sum()) if not requests.empty else 0)
+        col4.metric("Daten", f"{requests['bytes'].fillna(0).sum() / 1024:.0f} kB" if not requests.empty else "0 kB")
+
+        # One row per event in start order, repeated requests to the same URL template included
+        labels = (events.index.to_series() + 1).astype(str) + ". " + events["kind"] + ": " + events["name"]
+        colors = events["kind"].map({"section": "black", "request": "grey", "retry": "red"})
+        fig = go.Figure(go.Bar(
+            base=events["offset"],
+            x=events["duration"].clip(lower=0.002),
+            y=labels,
+            orientation="h",
+            marker_color=colors,
+            hovertext=events.get("url", labels),
+        ))
+        fig.update_layout(
+            xaxis_title="Sekunden seit Beginn des Durchlaufs",
+            yaxis={"autorange": "reversed", "showticklabels": len(events) <= 40},
+            height=min(200 + 18 * len(events), 900),
+            margin={"l": 10, "r": 10, "t": 10, "b": 10},
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+        columns = [column for column in ["kind", "name", "status", "cache", "bytes", "offset", "duration", "thread"]
+                   if column in events]
+        st.dataframe(events[columns], use_container_width=True)
@@ -0,0 +1,47 @@
+"""
+------------------------------------------------------------------------------
+Map based on selection
+------------------------------------------------------------------------------
+"""
+
+import streamlit as st
+
+from src.geometry import fit_view, level_for_zoom, load_district_geometry
+
+
+def render_map(selected_district):
+    """
+    Shows the selected district (e.g. 'Mitte') on a pydeck map fitted to its bounding box.
+    """
+    import pydeck as pdk
+
+    # District geometry
+    # pre-processed geojson-file based on open data from geoportal Berlin (https://gdi.berlin.de/viewer/main/) 
+    # 'ALKIS Berlin Bezirke', data accessible via WFS-Service
+    # simplified once per district by src/geometry.py
+    district_geom = load_district_geometry(selected_district)
+
+    # Fit map view to the district, use the simplified geometry matching the zoom
+    latitude, longitude, zoom = fit_view(district_geom["bbox"])
+    district_geojson = district_geom["levels"][level_for_zoom(zoom)]
+
+    view_state = pdk.ViewState(latitude=latitude, longitude=longitude, zoom=zoom)
+
+    # Pydeck map
+    deck = pdk.Deck(
+        initial_view_state=view_state,
+        layers=[
+            pdk.Layer(
+                "GeoJsonLayer",
+                data=district_geojson,
+                get_fill_color="[78, 141, 111, 255]", # RGBA
+                get_line_color="[0, 0, 0]",  # Black 
+                line_width=2,
+                pickable=True,
+                opacity=0.5
+                ),
+        ],
+        map_style="https://basemaps.cartocdn.com/gl/positron-gl-style/style.json" # carto positron
+    )
+
+    st.pydeck_chart(deck)
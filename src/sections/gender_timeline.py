@@ -0,0 +1,84 @@
+"""
+------------------------------------------------------------------------------
+gender proportion of active members over time
+------------------------------------------------------------------------------
+"""
+
+import pandas as pd
+import streamlit as st
+
+from src.functions import BVV_CLASSIFICATIONS, gender_over_time
+
+
+@st.fragment
+def render_gender_timeline(members, selected_district):
+    """
+    Shows the gender proportion of the active BVV members over time and, on demand, the dataset.
+    Runs as fragment: changing the time resolution or showing the dataset only reruns this section.
+
+    Args:
+    - members: all memberships (see members_table)
+    - selected_district: district name
+    """
+    import plotly.express as px
+
+    # Filter all past and current members by BVV
+    BVV_all_years = members[members["orga_current"] & members["classification"].isin(BVV_CLASSIFICATIONS)]
+
+    # Year range
+    min_year = BVV_all_years["startDate"].dt.year.min()
+    max_year = pd.to_datetime("today").year
+
+    min_year = int(min_year)
+    max_year = int(max_year)
+
+    st.subheader(f"Entwicklung der Geschlechterverteilung in der BVV {selected_district.title()} von {min_year} bis {max_year}")
+
+    # Check if "formOfAddress" column exists
+    if "formOfAddress" not in BVV_all_years.columns or BVV_all_years["formOfAddress"].isnull().all():
+        st.error("Error: 'formOfAddress' column is missing or contains only invalid values.")
+    else:
+        
+        # Time resolution of the chart
+        resolutions = {"Jahr": "Y", "Wahlperiode": "election", "Quartal": "Q", "Monat": "M"}
+        resolution = st.radio("Zeitliche Auflösung:", list(resolutions), horizontal=True)
+
+        # Active members by gender per period
+        all_years_gender = gender_over_time(BVV_all_years, resolutions[resolution])
+        all_years_gender = all_years_gender.rename(columns={"Zeitraum": resolution})
+
+        color_map = {
+            "Anteil Frauen %": "#c1a5fe",  
+            "Anteil Männer %": "#4E8D6F"
+            }
+
+        fig = px.line(
+            all_years_gender,
+            x= resolution,
+            y=["Anteil Frauen %", "Anteil Männer %"],
+            labels={"value": "Prozent", resolution: resolution},
+            markers=True,
+            color_discrete_map=color_map
+        )
+
+        fig.update_traces(
+            hovertemplate=(
+                f"{resolution}: %{{x}}<br>"
+                "Anteil Frauen %: %{customdata[0]:.2f}<br>"  
+                "Anteil Männer %: %{customdata[1]:.2f}<br>"  
+                "Anzahl Frauen: %{customdata[2]}<br>" 
+                "Anzahl Männer: %{customdata[3]}" 
+            ),
+            customdata=all_years_gender[["Anteil Frauen %", "Anteil Männer %", "Anzahl Frauen", "Anzahl Männer"]].values,  # custom data as array
+        )
+        
+        fig.update_layout(
+            yaxis=dict(ticksuffix="%"),
+            legend_title_text="Legende"
+        )
+
+        st.plotly_chart(fig, use_container_width=True)
+
+    # Show dataset if checkbox
+    if st.checkbox("Datensatz anzeigen"):
+        st.write(BVV_all_years[["role", "votingRight", "startDate", "endDate", "name", "formOfAddress", "orgaName", "shortName", "orgaType", "classification", "orga_startDate", "orga_endDate"]].reset_index(drop=True))
@@ -0,0 +1,40 @@
+"""
+------------------------------------------------------------------------------
+Current number of persons by Orga
+------------------------------------------------------------------------------
+"""
+
+import streamlit as st
+
+
+def render_membership_chart(orgaIndex):
+    """
+    Shows the current number of members per current organization as bar chart.
+
+    Args: orgaIndex: current organizations with their members (see organization_index)
+    """
+    import plotly.express as px
+
+    st.subheader("Aktuelle Mitgliederanzahl je Organisation")
+
+    # Current organizations with members, counted by organization id
+    noMembers_perOrga = orgaIndex.loc[orgaIndex["noMembers"] > 0, ["label", "noMembers", "isFaction"]]
+    noMembers_perOrga = noMembers_perOrga.rename(columns={"label": "organization"})
+
+    # Sort organizations by number of members in descending order
+    noMembers_perOrga = noMembers_perOrga.sort_values("noMembers")
+
+    fig = px.bar(noMembers_perOrga, x = "noMembers", y = "organization",
+                 text=noMembers_perOrga["noMembers"],
+                 labels = {"noMembers": "Mitgliederanzahl", "organization": "Ausschuss/Fraktion"})
+
+
+    fig.update_layout(height=600)
+
+    # Different bar color for fraktionen
+    colors = noMembers_perOrga["isFaction"].map({True: "#4E8D6F", False: "#8bbf9f"})
+
+    fig.update_traces(marker_color= colors, textfont_size=16) # Edit marker colors/ font size
+    fig.update_layout(yaxis={"categoryorder":"total ascending"})  # Sort
+
+    st.plotly_chart(fig, use_container_width = True)
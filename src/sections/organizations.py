@@ -0,0 +1,34 @@
+"""
+------------------------------------------------------------------------------
+Orga data
+------------------------------------------------------------------------------
+"""
+
+import streamlit as st
+
+
+def render_organizations(orgaIndex):
+    """
+    Shows all current organizations in a grid with their current members and roles.
+
+    Args: orgaIndex: current organizations with their members (see organization_index)
+    """
+    st.subheader("Bezirksverordnetenversammlung, Ausschüsse und Fraktionen")
+    st.caption("Übersicht aller Organisationen mit Angabe zu Kurzform, Kategorie und Klassifikation. Klicke auf 'Mitglieder anzeigen', um alle aktuellen Mitglieder einzusehen.")
+
+    # Create grid layout for evenly distributed orga names
+    rows = list(orgaIndex.itertuples(index=False))
+    for i in range(0, len(rows), 3):
+        cols = st.columns(3)
+        for col, row in zip(cols, rows[i:i + 3]):
+            with col:
+                st.markdown(f"**{row.orgaName}**")
+                st.caption(f"{row.shortName} | {row.orgaType} | {row.classification}")
+            
+                # Toggle to show names and roles
+                with st.expander("Mitglieder anzeigen"):
+                    # Display names and roles
+                    if row.noMembers:
+                        st.markdown(row.memberList)
+                    else:
+                        st.caption("Keine Mitglieder verfügbar.")
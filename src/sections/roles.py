@@ -0,0 +1,59 @@
+"""
+------------------------------------------------------------------------------
+average no. of roles per person f/m
+------------------------------------------------------------------------------
+"""
+
+import streamlit as st
+
+
+def render_roles(currentMembers):
+    """
+    Shows the average number of current roles per person by gender.
+
+    Args: currentMembers: current memberships (see members_table)
+    """
+    # Check if "formOfAddress" column exists
+    if "formOfAddress" not in currentMembers.columns or currentMembers["formOfAddress"].isnull().all():
+        st.error("Error: 'formOfAddress' column is missing or contains only invalid values.")
+        return
+
+    st.subheader("Durchschnittliche Anzahl an Rollen pro Person nach Geschlecht")
+    st.caption("Einige Mitglieder der BVV übernehmen weitere Funktionen in Ausschüssen und Fraktionen. In der folgenden Visualisierung wird die durchschnittliche Anzahl an Rollen nach Geschelcht dargestellt.")
+
+    gender_role_counts = currentMembers.groupby(["formOfAddress", "name"], observed=True).size().reset_index(name="roles")
+    # Map gender
+    gender_role_counts["formOfAddress"] = gender_role_counts["formOfAddress"].astype(object).map({"Herr": "M", "Frau": "W"})
+    # Average number in column "roles"
+    gender_role_avg = gender_role_counts.groupby("formOfAddress")["roles"].mean().reset_index()
+    gender_role_avg["roles"] = gender_role_avg["roles"].round(2)
+    # Average number by gender
+    male_avg = gender_role_avg[gender_role_avg["formOfAddress"] == "M"]["roles"].item()
+    female_avg = gender_role_avg[gender_role_avg["formOfAddress"] == "W"]["roles"].item()
+
+    # Show metric in two columns
+    col3, col4 = st.columns(2)
+
+    with col3:
+        st.metric("⌀ Anzahl an Rollen", f"{male_avg:.2f}")
+        st.metric("⌀ Anzahl an Rollen", f"{female_avg:.2f}")
+        
+    with col4:
+        # Add visual representation
+        max_value = max(male_avg, female_avg)
+        male_width = (male_avg / max_value) * 100
+        female_width = (female_avg / max_value) * 100
+
+        # st.progress() does not support custom hex color values
+        # workaround with html
+        st.markdown(f"""
+        <div style="display: flex; align-items: center; margin-bottom: 10px;">
+            <div style="width: 50px; text-align: right; margin-right: 10px;font-size: 14px;">Männer</div>
+            <div style="background-color: #4E8D6F; width: {male_width}%; height: 20px;"></div>
+        </div>
+        <br>
+        <div style="display: flex; align-items: center;">
+            <div style="width: 50px; text-align: right; margin-right: 10px;font-size: 14px;">Frauen</div>
+            <div style="background-color: #c1a5fe; width: {female_width}%; height: 20px;"></div>
+        </div>
+        """, unsafe_allow_html=True)
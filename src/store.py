@@ -0,0 +1,217 @@
+"""
+------------------------------------------------------------------------------
+Libraries
+------------------------------------------------------------------------------
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+
+"""
+------------------------------------------------------------------------------
+Settings
+------------------------------------------------------------------------------
+"""
+
+# Name of the file pointing to the current version of a dataset
+POINTER_FILE = "CURRENT"
+
+# Number of versions kept besides the current one, for readers still using them
+KEEP_VERSIONS = 2
+
+
+"""
+------------------------------------------------------------------------------
+Arrow conversion
+------------------------------------------------------------------------------
+"""
+
+def flat_columns(df):
+    """
+    Returns the data frame with nested values (lists, dicts) stored as JSON strings,
+    so that every column has a flat Arrow type.
+    """
+    nested = [column for column in df.columns[df.dtypes == object]
+              if df[column].map(lambda value: isinstance(value, (list, dict))).any()]
+    if not nested:
+        return df
+    df = df.copy()
+    for column in nested:
+        df[column] = df[column].map(lambda value: json.dumps(value) if isinstance(value, (list, dict)) else value)
+    return df
+
+
+# Schema meta data key of the columns stored in a layout that open_table converts back (see to_arrow)
+LAYOUT_KEY = b"bvv_layouts"
+
+
+def to_arrow(df):
+    """
+    Converts a data frame to an Arrow table whose columns can be read back without a copy:
+    - dates are stored without null bitmap, NaT as pandas' own NaT value
+    - categorical columns (with string categories) are stored as their integer codes, missing values
+      as code -1, and the categories in the schema meta data
+    - bool columns are stored as uint8, nullable boolean columns as uint8 values plus a
+      uint8 mask column '<name>.mask' (Arrow packs booleans into bits, pandas uses one byte per value)
+    These layouts are listed in the schema meta data and only meant to be read with open_table.
+    """
+    table = pa.Table.from_pandas(flat_columns(df), preserve_index=False)
+    pandas_meta = json.loads(table.schema.metadata[b"pandas"])
+    layouts = {}
+    for i, column in enumerate(df.columns):
+        dtype = df[column].dtype
+        field = table.schema.field(i).with_nullable(False)
+        if isinstance(dtype, pd.DatetimeTZDtype) or pd.api.types.is_datetime64_dtype(dtype):
+            values = df[column].array.asi8
+            table = table.set_column(i, field, pa.Array.from_buffers(field.type, len(values), [None, pa.py_buffer(values)]))
+        elif isinstance(dtype, pd.CategoricalDtype) and pd.api.types.is_string_dtype(dtype.categories):
+            codes = df[column].cat.codes.to_numpy()
+            table = table.set_column(i, pa.field(column, pa.from_numpy_dtype(codes.dtype), nullable=False), pa.array(codes))
+            layouts[column] = {"categories": dtype.categories.tolist(), "ordered": bool(dtype.ordered)}
+            pandas_meta["columns"][i].update(pandas_type=str(codes.dtype), numpy_type=str(codes.dtype), metadata=None)
+        elif isinstance(dtype, pd.BooleanDtype) or dtype == bool:
+            values = df[column].to_numpy(dtype=bool, na_value=False)
+            if isinstance(dtype, pd.BooleanDtype):
+                mask = df[column].isna().to_numpy()
+                table = table.append_column(f"{column}.mask", pa.array(mask.view("uint8")))
+            table = table.set_column(i, pa.field(column, pa.uint8(), nullable=False), pa.array(values.view("uint8")))
+            layouts[column] = {"type": "boolean" if isinstance(dtype, pd.BooleanDtype) else "bool"}
+            pandas_meta["columns"][i].update(pandas_type="uint8", numpy_type="uint8", metadata=None)
+
+    return table.replace_schema_metadata({b"pandas": json.dumps(pandas_meta).encode("utf-8"),
+                                          LAYOUT_KEY: json.dumps(layouts).encode("utf-8")})
+
+
+"""
+------------------------------------------------------------------------------
+Publishing
+------------------------------------------------------------------------------
+"""
+
+def current_version(directory):
+    """
+    Returns the current version of the dataset in the directory, or None if none was published.
+    """
+    try:
+        with open(os.path.join(directory, POINTER_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def fingerprint(tables):
+    """
+    Returns a hash of the column names and values of the tables (dict of data frames by name),
+    used to skip publishing an unchanged dataset.
+    """
+    digest = hashlib.sha1()
+    for name, df in sorted(tables.items()):
+        df = flat_columns(df)
+        digest.update(repr((name, list(df.columns))).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def publish(directory, tables, meta):
+    """
+    Writes the tables of a dataset as uncompressed Arrow IPC files (one per table) and its
+    meta data as JSON into a new version directory, then switches the pointer file to it.
+    Readers see either the previous or the new version, never a partially written one.
+    Returns the new version.
+
+    Args:
+    - directory: dataset directory, e.g. snapshots/mitte
+    - tables: dict of data frames by table name
+    - meta: JSON-serializable meta data
+    """
+    version = f"{time.time_ns()}-{os.getpid()}"
+    target = os.path.join(directory, version)
+    tmp = f"{target}.tmp"
+    os.makedirs(tmp)
+
+    for name, df in tables.items():
+        table = to_arrow(df)
+        with ipc.new_file(os.path.join(tmp, f"{name}.arrow"), table.schema) as writer:
+            writer.write_table(table)
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, target)
+
+    # Atomic swap of the pointer
+    pointer = os.path.join(directory, POINTER_FILE)
+    with open(f"{pointer}.{os.getpid()}.tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(f"{pointer}.{os.getpid()}.tmp", pointer)
+
+    remove_old_versions(directory)
+    return version
+
+
+def remove_old_versions(directory, keep=KEEP_VERSIONS):
+    """
+    Deletes all versions except the current one and the keep most recent others.
+    Memory maps of deleted files stay valid until they are closed (not on Windows, where
+    files in use are skipped).
+    """
+    current = current_version(directory)
+    versions = sorted((name for name in os.listdir(directory)
+                       if name != current and os.path.isdir(os.path.join(directory, name)) and not name.endswith(".tmp")),
+                      key=lambda name: int(name.split("-")[0]), reverse=True)
+    for name in versions[keep:]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+"""
+------------------------------------------------------------------------------
+Opening
+------------------------------------------------------------------------------
+"""
+
+def open_table(path):
+    """
+    Memory-maps an Arrow IPC file written by publish and returns it as data frame. Number, date,
+    string (pandas >= 3, Arrow-backed), categorical (codes) and boolean columns point into the mapped
+    file instead of being copied, so processes opening the same file share its pages.
+    Only the categories of categorical columns are copied.
+    """
+    table = ipc.open_file(pa.memory_map(path)).read_all()
+    layouts = json.loads((table.schema.metadata or {}).get(LAYOUT_KEY, b"{}"))
+    df = table.to_pandas(split_blocks=True)
+    if not layouts:
+        return df
+
+    columns = {}
+    for column in df.columns:
+        layout = layouts.get(column)
+        if layout is None:
+            if not (column.endswith(".mask") and column[:-len(".mask")] in layouts):
+                columns[column] = df[column]
+        elif "categories" in layout:
+            dtype = pd.CategoricalDtype(layout["categories"], ordered=layout["ordered"])
+            columns[column] = pd.Categorical.from_codes(df[column].to_numpy(), dtype=dtype)
+        elif layout["type"] == "boolean":
+            columns[column] = pd.arrays.BooleanArray(df[column].to_numpy().view(bool),
+                                                     df[f"{column}.mask"].to_numpy().view(bool))
+        else:
+            columns[column] = df[column].to_numpy().view(bool)
+    return pd.DataFrame(columns, copy=False)
+
+
+def open_version(directory, version, names):
+    """
+    Opens the tables (names) and the meta data of a version, see publish.
+    Returns a dict with a data frame per table and 'meta'.
+    """
+    path = os.path.join(directory, version)
+    dataset = {name: open_table(os.path.join(path, f"{name}.arrow")) for name in names}
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        dataset["meta"] = json.load(f)
+    return dataset
@@ -0,0 +1,162 @@
+"""
+------------------------------------------------------------------------------
+Background warm-up of the district caches
+
+Enabled in the app with the environment variable BVV_WARMUP=1.
+------------------------------------------------------------------------------
+"""
+
+import itertools
+import os
+import queue
+import threading
+import time
+
+import streamlit as st
+
+from src.aggregates import update_district_aggregates
+from src.cache import get_json, ttl_for
+from src.functions import DISTRICTS, fetch_all_pages, sync_memberships, system_url
+from src.ingest import build_district_dataset, write_district_snapshot
+from src.scheduler import BACKGROUND, INTERACTIVE, request_priority
+
+
+# Enable the warm-up at server start
+ENABLED = os.environ.get("BVV_WARMUP", "") not in ("", "0")
+
+# Number of districts warmed at the same time
+MAX_WORKERS = int(os.environ.get("BVV_WARMUP_WORKERS", 2))
+
+# Publish the warmed datasets as shared snapshots (see src/store.py)
+PUBLISH = os.environ.get("BVV_WARMUP_PUBLISH", "1") not in ("", "0")
+
+# Refresh cycle (in seconds), shorter than the lifetime of the in-memory cache (CACHE_TTL)
+REFRESH_INTERVAL = 45 * 60
+
+# Disk cache entries older than this share of their TTL are revalidated during a refresh
+REFRESH_FRACTION = 0.75
+
+
+"""
+------------------------------------------------------------------------------
+Warm-up
+------------------------------------------------------------------------------
+"""
+
+def refresh_district(district):
+    """
+    Revalidates the disk cache entries of a district that are close to expiry, and synchronizes
+    its person list (only persons modified since the last sync are fetched, see sync_memberships),
+    so that the next cache fill does not wait for the API.
+    """
+    systemUrl = system_url(district)
+    systemData = get_json(systemUrl, ttl_for(systemUrl) * REFRESH_FRACTION)
+    bodiesData = get_json(systemData["body"], ttl_for(systemData["body"]) * REFRESH_FRACTION)
+    body = bodiesData["data"][0]
+
+    sync_memberships(body["person"])
+    for url in (body.get("organization"), body["meeting"]):
+        if url:
+            fetch_all_pages(url, max_age=ttl_for(url) * REFRESH_FRACTION)
+
+
+def warm_district(district):
+    """
+    Builds the dataset of a district from the disk cache and the synchronized person list
+    (see build_district_dataset), bypassing the in-memory caches so that the data revalidated
+    by refresh_district is used. Publishes it as snapshot, which all sessions and app processes
+    then share, and updates the district's aggregates for the comparison.
+    """
+    dataset = build_district_dataset(district)
+
+    # Incomplete data raises IncompleteError above, so only complete datasets are published,
+    # and only if they changed since the current snapshot
+    if PUBLISH:
+        write_district_snapshot(district, dataset)
+
+    # Only rewritten if the aggregates changed
+    update_district_aggregates(district, dataset["members"], dataset["organizations"], dataset["agenda"])
+
+
+class WarmupScheduler:
+    """
+    Warms the caches of all districts in the background with bounded concurrency
+    and refreshes them periodically. Districts requested by a user are moved to the front.
+
+    Args:
+    - districts: districts to warm
+    - max_workers: Number of districts warmed at the same time.
+    - refresh_interval: Seconds between two refresh cycles.
+    """
+
+    def __init__(self, districts=DISTRICTS, max_workers=MAX_WORKERS, refresh_interval=REFRESH_INTERVAL):
+        self.districts = list(districts)
+        self.max_workers = max_workers
+        self.refresh_interval = refresh_interval
+        self.last_warmed = {}
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()  # keeps FIFO order within a priority class
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self):
+        for _ in range(self.max_workers):
+            threading.Thread(target=self._work, daemon=True).start()
+        threading.Thread(target=self._refresh_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def submit(self, district, priority=BACKGROUND):
+        self._queue.put((priority, next(self._counter), district))
+
+    def prioritize(self, district):
+        """
+        Moves a district to the front of the queue unless it was warmed recently.
+        """
+        if not self.is_warm(district):
+            self.submit(district, INTERACTIVE)
+
+    def is_warm(self, district):
+        with self._lock:
+            last = self.last_warmed.get(district)
+        return last is not None and time.time() - last < self.refresh_interval
+
+    def _refresh_loop(self):
+        while not self._stopped.is_set():
+            for district in self.districts:
+                self.submit(district)
+            self._stopped.wait(self.refresh_interval)
+
+    def _work(self):
+        while not self._stopped.is_set():
+            priority, _, district = self._queue.get()
+            try:
+                # Skip duplicates queued while the district was being warmed
+                with self._lock:
+                    last = self.last_warmed.get(district)
+                if last is not None and time.time() - last < self.refresh_interval / 2:
+                    continue
+
+                start = time.perf_counter()
+                # Requests of districts selected by a user are sent before the periodic refresh
+                with request_priority(priority):
+                    refresh_district(district)
+                    warm_district(district)
+                with self._lock:
+                    self.last_warmed[district] = time.time()
+                print(f"Warm-up {district}: {time.perf_counter() - start:.1f}s")
+
+            except Exception as e:
+                print(f"Warm-up of {district} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+
+@st.cache_resource
+def get_warmup_scheduler():
+    """
+    Returns the warm-up scheduler of the server process, started on first call.
+    """
+    return WarmupScheduler().start()
@@ -0,0 +1,35 @@
+"""
+Tests of the membership interval index and the gender counts built on it.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+import pandas as pd
+
+from src.functions import gender_over_time
+from src.intervals import MembershipIntervals
+
+
+def future_members():
+    # One current membership and one starting after the covered range
+    return pd.DataFrame({
+        "startDate": ["2020-01-01", "2030-01-01"],
+        "endDate": [None, None],
+        "formOfAddress": ["Frau", "Herr"],
+    })
+
+
+def test_count_active_excludes_memberships_starting_after_until():
+    intervals = MembershipIntervals(future_members())
+    boundaries = pd.to_datetime(["2024-01-01", "2025-01-01", "2026-01-01"])
+    assert intervals.count_active(boundaries, until="2026-10-18").tolist() == [1, 1, 1]
+    assert intervals.count_active(boundaries).tolist() == [1, 1, 2]
+
+
+def test_gender_over_time_does_not_count_future_memberships():
+    until = pd.Timestamp("2026-10-18")
+    for freq in ("Y", "M", "election"):
+        genders = gender_over_time(future_members(), freq, until=until)
+        last = genders.iloc[-1]
+        assert (last["Anzahl Frauen"], last["Anzahl Männer"]) == (1, 0), freq